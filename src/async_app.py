@@ -0,0 +1,159 @@
+"""
+Asyncio read path (ASGI)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from quart import Quart, Response, jsonify, request
+from werkzeug.exceptions import HTTPException
+import config
+from async_db import close_async_connections
+from bulk import bulk_result, parse_ids
+from http_cache import cached_response, etag_matches, make_etag
+from instrumentation import init_async_app_metrics
+from orders.controllers.order_controller import parse_report_window
+from orders.queries import read_order_async, read_user_async
+from serialization import FastJSONProvider
+from stocks.controllers.graphql_controller import execute_graphql_async
+from stocks.queries import read_product_async, read_stock_async
+from store_manager import app as flask_app, counter_best_sellers, counter_highest_spenders
+
+# optimization: les lectures attendent Redis/MySQL sans bloquer de thread: un processus peut en servir des milliers à la fois
+# https://quart.palletsprojects.com/en/latest/
+async_app = Quart(__name__)
+async_app.json = FastJSONProvider(async_app)
+# Mêmes métriques que les routes Flask: durée, requêtes en cours, temps passé dans MySQL/Redis/Python
+init_async_app_metrics(async_app)
+
+@async_app.after_serving
+async def close_connections():
+    await close_async_connections()
+
+@async_app.get('/orders/<int:order_id>')
+async def get_order_id(order_id):
+    """Get order with a given order_id"""
+    return await _get_one(read_order_async.get_order_by_id, order_id)
+
+@async_app.get('/products/<int:product_id>')
+async def get_product_id(product_id):
+    """Get product with a given product_id"""
+    return await _get_one(read_product_async.get_product_by_id, product_id)
+
+@async_app.get('/users/<int:user_id>')
+async def get_user_id(user_id):
+    """Get user with a given user_id"""
+    return await _get_one(read_user_async.get_user_by_id, user_id)
+
+@async_app.get('/stocks/<int:product_id>')
+async def get_stocks_id(product_id):
+    """Get product stocks by product_id"""
+    return await _get_one(read_stock_async.get_stock_by_id, product_id)
+
+@async_app.get('/orders')
+async def get_orders_ids():
+    """Get several orders by order_id"""
+    return await _get_many(read_order_async.get_orders_by_ids)
+
+@async_app.get('/products')
+async def get_products_ids():
+    """Get several products by product_id"""
+    return await _get_many(read_product_async.get_products_by_ids)
+
+@async_app.get('/users')
+async def get_users_ids():
+    """Get several users by user_id"""
+    return await _get_many(read_user_async.get_users_by_ids)
+
+@async_app.get('/stocks')
+async def get_stocks_ids():
+    """Get the stocks of several products by product_id"""
+    return await _get_many(read_stock_async.get_stocks_by_ids)
+
+@async_app.get('/orders/reports/highest-spenders')
+async def get_orders_highest_spending_users():
+    """Get list of highest speding users, ordered by total expenditure (all-time, or ?window=30d / ?from=&to=)"""
+    counter_highest_spenders.inc()
+    return await _get_report('highest_spenders')
+
+@async_app.get('/orders/reports/best-sellers')
+async def get_orders_report_best_selling_products():
+    """Get list of best selling products, ordered by number of orders (all-time, or ?window=30d / ?from=&to=)"""
+    counter_best_sellers.inc()
+    return await _get_report('best_sellers')
+
+@async_app.post('/stocks/graphql-query')
+async def graphql_supplier():
+    payload, status = await execute_graphql_async(await request.get_json(silent=True) or {})
+    return jsonify(payload), status
+
+async def _get_one(query, id):
+    try:
+        return jsonify(await query(id)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+async def _get_many(query):
+    try:
+        ids = parse_ids(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(bulk_result(ids, await query(ids))), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+async def _get_report(report):
+    try:
+        start_day, end_day = parse_report_window(request.args) or (None, None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        etag = await read_order_async.get_report_etag(report, start_day, end_day)
+        if etag and etag_matches(request, etag):
+            return cached_response(request, None, etag, max_age=config.REPORT_HTTP_MAX_AGE, response_class=Response)
+        body, etag = await read_order_async.get_serialized_report(report, start_day, end_day)
+        return cached_response(request, body, etag or make_etag(body), max_age=config.REPORT_HTTP_MAX_AGE, response_class=Response)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+class PooledWsgiToAsgi:
+    """ ASGI adapter running a WSGI app on a bounded thread pool.
+    asgiref's WsgiToAsgi runs it with thread_sensitive=True, i.e. every request of the process on one shared thread """
+
+    def __init__(self, wsgi_app, max_workers):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        instance = WsgiToAsgiInstance(self.wsgi_app)
+        # run_wsgi_app est décoré par @sync_to_async: on reprend la fonction synchrone pour l'exécuter dans notre pool
+        run_wsgi_app = functools.partial(instance.run_wsgi_app.__wrapped__, instance)
+        instance.run_wsgi_app = sync_to_async(run_wsgi_app, thread_sensitive=False, executor=self.executor)
+        await instance(scope, receive, send)
+
+class ReadWriteDispatcher:
+    """ ASGI application: the read routes above are served by the asyncio app,
+    every other request (commands, overview, metrics...) by the Flask app in a thread pool of SERVER_THREADS threads """
+
+    def __init__(self, read_app, wsgi_app, max_workers=None):
+        self.read_app = read_app
+        self.wsgi_app = PooledWsgiToAsgi(wsgi_app, max_workers or config.SERVER_THREADS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self._is_read_route(scope):
+            # Le cycle de vie (lifespan) revient aussi à Quart, qui ferme ses pools à l'arrêt
+            return await self.read_app(scope, receive, send)
+        return await self.wsgi_app(scope, receive, send)
+
+    def _is_read_route(self, scope):
+        try:
+            self.read_app.url_map.bind('localhost').match(scope['path'], method=scope['method'])
+            return True
+        except HTTPException:
+            return False
+
+# Point d'entrée ASGI: uvicorn async_app:application (ou server.py avec SERVER_MODE=asgi)
+application = ReadWriteDispatcher(async_app, flask_app)
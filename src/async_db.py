@@ -0,0 +1,79 @@
+"""
+Asynchronous database connections (read path)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+
+import redis.asyncio as aioredis
+import config
+from instrumentation import InstrumentedAsyncRedis, instrument_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# Pools propres au chemin asynchrone: une connexion n'y est tenue que le temps d'une commande, pas d'un thread
+# https://redis.readthedocs.io/en/stable/examples/asyncio_examples.html
+# https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html
+_redis_pool = None
+_redis_binary_pool = None
+_engine = None
+_session_factory = None
+
+def get_async_redis_conn():
+    """Get an asyncio Redis connection from the process-wide async pool"""
+    global _redis_pool
+    if _redis_pool is None:
+        _redis_pool = aioredis.ConnectionPool(
+            host=config.REDIS_HOST,
+            port=config.REDIS_PORT,
+            db=config.REDIS_DB,
+            max_connections=config.ASYNC_REDIS_MAX_CONNECTIONS,
+            decode_responses=True
+        )
+    return InstrumentedAsyncRedis(connection_pool=_redis_pool)
+
+def get_async_redis_binary_conn():
+    """Get an asyncio Redis connection that returns bytes (no decoding)"""
+    global _redis_binary_pool
+    if _redis_binary_pool is None:
+        _redis_binary_pool = aioredis.ConnectionPool(
+            host=config.REDIS_HOST,
+            port=config.REDIS_PORT,
+            db=config.REDIS_DB,
+            max_connections=config.ASYNC_REDIS_MAX_CONNECTIONS,
+            decode_responses=False
+        )
+    return InstrumentedAsyncRedis(connection_pool=_redis_binary_pool)
+
+def get_async_engine():
+    """Get the process-wide asyncio SQLAlchemy engine (aiomysql), created on first use"""
+    global _engine, _session_factory
+    if _engine is None:
+        connection_string = f'mysql+aiomysql://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}'
+        _engine = create_async_engine(
+            connection_string,
+            pool_size=config.ASYNC_DB_POOL_SIZE,
+            max_overflow=config.ASYNC_DB_POOL_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING
+        )
+        instrument_engine(_engine.sync_engine)
+        _session_factory = async_sessionmaker(bind=_engine, expire_on_commit=False)
+    return _engine
+
+def get_async_session():
+    """Get an asyncio SQLAlchemy session, to use as `async with get_async_session() as session:`"""
+    get_async_engine()
+    return _session_factory()
+
+async def close_async_connections():
+    """Close the async pools (at the end of the event loop)"""
+    global _redis_pool, _redis_binary_pool, _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+    if _redis_pool is not None:
+        await _redis_pool.disconnect()
+        _redis_pool = None
+    if _redis_binary_pool is not None:
+        await _redis_binary_pool.disconnect()
+        _redis_binary_pool = None
@@ -0,0 +1,33 @@
+"""
+Bulk reads
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import config
+
+def parse_ids(args, name='ids'):
+    """Read a list of IDs from the query string (?ids=1,2,3), without duplicates and in request order"""
+    raw_ids = args.get(name)
+    if not raw_ids:
+        raise ValueError(f"Missing '{name}'. Expected a comma-separated list of IDs, e.g. {name}=1,2,3.")
+    raw_ids = raw_ids.split(',')
+    # Limite vérifiée avant d'analyser la liste: une très longue chaîne est refusée sans être parcourue
+    if len(raw_ids) > config.BULK_READ_MAX_IDS:
+        raise ValueError(f"Too many IDs: at most {config.BULK_READ_MAX_IDS} per request.")
+    ids = []
+    for raw_id in raw_ids:
+        raw_id = raw_id.strip()
+        # isascii(): isdigit() accepte aussi des chiffres comme '²' que int() refuse
+        if not (raw_id.isascii() and raw_id.isdigit()) or int(raw_id) == 0:
+            raise ValueError(f"Invalid ID '{raw_id}' in '{name}'. IDs must be positive integers.")
+        ids.append(int(raw_id))
+    # dict.fromkeys retire les doublons en gardant l'ordre de la requête
+    ids = list(dict.fromkeys(ids))
+    return ids
+
+def bulk_result(ids, found):
+    """Order the found records (dict keyed by ID) like the requested IDs, and list the missing ones"""
+    return {
+        'items': [found[id] for id in ids if id in found],
+        'missing': [id for id in ids if id not in found]
+    }
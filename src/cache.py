@@ -0,0 +1,226 @@
+"""
+Caches
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import config
+from logger import Logger
+from prometheus_client import Counter, Gauge
+from db import get_redis_binary_conn, get_redis_conn
+from serialization import dumps, dumps_str, loads
+from http_cache import make_etag
+
+logger = Logger.get_instance("cache")
+
+report_cache_requests = Counter('report_cache_requests', 'Report cache lookups', ['report', 'result'])
+local_cache_requests = Counter('local_cache_requests', 'In-process cache lookups', ['cache', 'result'])
+local_cache_evictions = Counter('local_cache_evictions', 'In-process cache entries evicted to respect the size bound', ['cache'])
+local_cache_hit_ratio = Gauge('local_cache_hit_ratio', 'Share of the in-process cache lookups that were hits', ['cache'], multiprocess_mode='liveall')
+
+read_tier_requests = Counter('read_tier_requests', 'Reads by the tier that served them (memory, redis, negative, mysql)', ['entity', 'tier'])
+
+# Canal Redis sur lequel les écritures annoncent les entrées à retirer des caches en mémoire de tous les réplicas
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Caches en mémoire du processus, par nom
+local_caches = {}
+
+# Libère le verrou seulement s'il nous appartient encore (il a pu expirer et être repris par un autre réplica)
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+release_lock_script = get_redis_conn().register_script(RELEASE_LOCK_LUA)
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+class ReportCache:
+    """ Read-through cache in Redis with stale-while-revalidate and request coalescing.
+
+    A value is fresh for `ttl` seconds, then served stale for `stale_ttl` more seconds while one worker
+    (across all threads and replicas) rebuilds it in the background. On a miss, only one worker rebuilds
+    the value; the others wait for it instead of rebuilding it too. """
+
+    def __init__(self, ttl=None, stale_ttl=None, lock_timeout=None):
+        self.ttl = ttl or config.REPORT_CACHE_TTL
+        self.stale_ttl = config.REPORT_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        self.lock_timeout = lock_timeout or config.REPORT_CACHE_LOCK_TIMEOUT
+        self._local_locks = {}
+        self._local_locks_guard = threading.Lock()
+
+    def get(self, key, builder, force_refresh=False):
+        """ Get the value cached under key, calling builder() to (re)build it when needed """
+        return loads(self.get_serialized(key, builder, force_refresh)[0])
+
+    def get_serialized(self, key, builder, force_refresh=False):
+        """ Same as get(), but returns the value as stored (JSON bytes) with its ETag, without decoding it """
+        r = get_redis_binary_conn()
+        if force_refresh:
+            return self._rebuild(r, key, builder)
+
+        pipeline = r.pipeline(transaction=False)
+        pipeline.get(key)
+        pipeline.get(f"{key}:etag")
+        pipeline.exists(f"{key}:fresh")
+        cached, etag, fresh = pipeline.execute()
+        etag = _decode(etag)
+
+        if cached is not None and fresh:
+            report_cache_requests.labels(key, 'hit').inc()
+            return cached, etag
+
+        if cached is not None:
+            report_cache_requests.labels(key, 'stale').inc()
+            token = self._acquire(r, key)
+            if token:
+                threading.Thread(target=self._refresh, args=(r, key, builder, token), daemon=True).start()
+            return cached, etag
+
+        report_cache_requests.labels(key, 'miss').inc()
+        # Un seul thread par processus reconstruit la valeur; les autres attendent puis relisent le cache
+        with self._local_lock(key):
+            cached = self._read(r, key)
+            if cached[0] is not None:
+                return cached
+            token = self._acquire(r, key)
+            if token:
+                return self._rebuild(r, key, builder, token)
+            # Un autre réplica reconstruit la valeur: on l'attend au plus lock_timeout secondes
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                cached = self._read(r, key)
+                if cached[0] is not None:
+                    return cached
+            return self._rebuild(r, key, builder)
+
+    def get_fresh_etag(self, key):
+        """ ETag of the value cached under key if it is still fresh, else None (one round-trip, nothing decoded) """
+        pipeline = get_redis_conn().pipeline(transaction=False)
+        pipeline.get(f"{key}:etag")
+        pipeline.exists(f"{key}:fresh")
+        etag, fresh = pipeline.execute()
+        return etag if fresh else None
+
+    def _read(self, r, key):
+        pipeline = r.pipeline(transaction=False)
+        pipeline.get(key)
+        pipeline.get(f"{key}:etag")
+        cached, etag = pipeline.execute()
+        return cached, _decode(etag)
+
+    def _refresh(self, r, key, builder, token):
+        try:
+            self._rebuild(r, key, builder, token)
+        except Exception:
+            pass  # déjà journalisé, la valeur périmée reste servie
+
+    def _rebuild(self, r, key, builder, token=None):
+        try:
+            serialized = dumps(builder())
+            etag = make_etag(serialized)
+            pipeline = r.pipeline(transaction=True)
+            pipeline.set(key, serialized, ex=int(self.ttl + self.stale_ttl))
+            pipeline.set(f"{key}:etag", etag, ex=int(self.ttl + self.stale_ttl))
+            pipeline.set(f"{key}:fresh", 1, ex=int(self.ttl))
+            pipeline.execute()
+            return serialized, etag
+        except Exception as e:
+            logger.error(f"Impossible de reconstruire {key}: {e}")
+            raise
+        finally:
+            if token:
+                release_lock_script(keys=[f"{key}:lock"], args=[token], client=r)
+
+    def _acquire(self, r, key):
+        token = str(uuid.uuid4())
+        if r.set(f"{key}:lock", token, nx=True, px=int(self.lock_timeout * 1000)):
+            return token
+        return None
+
+    def _local_lock(self, key):
+        with self._local_locks_guard:
+            return self._local_locks.setdefault(key, threading.Lock())
+
+
+class LRUCache:
+    """ Bounded in-process LRU cache, thread-safe, with an optional TTL (in seconds) per entry.
+    Lookups and evictions are counted on /metrics under the cache name """
+
+    def __init__(self, name, maxsize, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        local_caches[name] = self
+
+    def get(self, key, default=None):
+        """ Get the value cached under key, or default if it is missing or expired """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self._hits += 1
+                self._record('hit')
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            self._record('miss')
+        return default
+
+    def set(self, key, value):
+        """ Cache value under key, evicting the least recently used entries beyond maxsize """
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                local_cache_evictions.labels(self.name).inc()
+
+    def delete(self, key):
+        """ Remove key from the cache """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """ Remove every entry from the cache """
+        with self._lock:
+            self._entries.clear()
+
+    def _record(self, result):
+        local_cache_requests.labels(self.name, result).inc()
+        local_cache_hit_ratio.labels(self.name).set(self._hits / (self._hits + self._misses))
+
+def missing_key(entity, id):
+    """ Redis key remembering for a while that an ID does not exist in MySQL (negative caching) """
+    return f"missing:{entity}:{id}"
+
+def publish_invalidation(cache_name, key):
+    """ Remove key from a cache in this process now, and in the other replicas through Redis pub/sub """
+    cache = local_caches.get(cache_name)
+    if cache is not None:
+        cache.delete(key)
+    try:
+        get_redis_conn().publish(CACHE_INVALIDATION_CHANNEL, dumps_str({'cache': cache_name, 'key': key}))
+    except Exception as e:
+        # L'écriture est déjà validée: les autres réplicas verront le changement à l'expiration du TTL
+        logger.error(f"Impossible de publier l'invalidation de {cache_name}:{key}: {e}")
+
+def apply_invalidation(message):
+    """ Apply an invalidation message received on the pub/sub channel """
+    invalidation = loads(message)
+    cache = local_caches.get(invalidation.get('cache'))
+    if cache is not None:
+        cache.delete(invalidation.get('key'))
@@ -18,3 +18,101 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = int(os.getenv("REDIS_PORT"))
 REDIS_DB = int(os.getenv("REDIS_DB"))
+
+# Pool de connexions MySQL (SQLAlchemy QueuePool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Nombre maximal de commandes acceptées par POST /orders/batch
+ORDER_BATCH_MAX_SIZE = int(os.getenv("ORDER_BATCH_MAX_SIZE", 500))
+
+# Relais de l'outbox MySQL -> Redis
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 200))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0))
+
+# Rafraîchissement périodique des rapports (secondes)
+REPORT_REFRESH_INTERVAL = float(os.getenv("REPORT_REFRESH_INTERVAL", 60))
+REPORT_REFRESH_JITTER = float(os.getenv("REPORT_REFRESH_JITTER", 5))
+
+# Cache des rapports (secondes): frais pendant TTL, puis servi périmé pendant STALE_TTL le temps d'être reconstruit
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", 60))
+REPORT_CACHE_STALE_TTL = float(os.getenv("REPORT_CACHE_STALE_TTL", 600))
+REPORT_CACHE_LOCK_TIMEOUT = float(os.getenv("REPORT_CACHE_LOCK_TIMEOUT", 10))
+
+# Période maximale (en jours) d'un rapport ?from=&to= ou ?window=
+REPORT_MAX_WINDOW_DAYS = int(os.getenv("REPORT_MAX_WINDOW_DAYS", 731))
+
+# Nombre de requêtes GraphQL analysées et validées gardées en mémoire (par processus)
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.getenv("GRAPHQL_DOCUMENT_CACHE_SIZE", 256))
+
+# Requêtes GraphQL persistées dans Redis: durée de vie (en secondes, prolongée à chaque utilisation) et taille maximale
+GRAPHQL_PERSISTED_QUERY_TTL = int(os.getenv("GRAPHQL_PERSISTED_QUERY_TTL", 7 * 24 * 3600))
+GRAPHQL_PERSISTED_QUERY_MAX_LENGTH = int(os.getenv("GRAPHQL_PERSISTED_QUERY_MAX_LENGTH", 20000))
+
+# Limites des requêtes GraphQL (coût ≈ nombre de lectures Redis, profondeur et nombre d'alias)
+GRAPHQL_MAX_COST = int(os.getenv("GRAPHQL_MAX_COST", 1000))
+GRAPHQL_MAX_DEPTH = int(os.getenv("GRAPHQL_MAX_DEPTH", 8))
+GRAPHQL_MAX_ALIASES = int(os.getenv("GRAPHQL_MAX_ALIASES", 100))
+
+# Caches en mémoire des produits et des utilisateurs (nombre d'entrées, TTL en secondes)
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", 1000))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", 300))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 300))
+
+# Nombre maximal d'identifiants par lecture groupée (GET /products?ids=..., /users, /stocks, /orders)
+BULK_READ_MAX_IDS = int(os.getenv("BULK_READ_MAX_IDS", 200))
+
+# Durée (secondes) pendant laquelle un identifiant inexistant est mémorisé dans Redis pour épargner MySQL
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", 60))
+
+# Durée de vie (secondes) d'un hash de commande recopié de MySQL vers Redis lors d'une lecture
+ORDER_REHYDRATE_TTL = int(os.getenv("ORDER_REHYDRATE_TTL", 3600))
+# Délai (secondes) laissé au relais de l'outbox pour écrire une commande dans Redis: au-delà, son absence est une dérive
+ORDER_RELAY_LAG_BOUND = int(os.getenv("ORDER_RELAY_LAG_BOUND", 60))
+
+# Aperçu du stock: taille maximale d'une page JSON et taille des blocs lus depuis MySQL en mode flux
+STOCK_OVERVIEW_MAX_PAGE_SIZE = int(os.getenv("STOCK_OVERVIEW_MAX_PAGE_SIZE", 1000))
+STOCK_OVERVIEW_CHUNK_SIZE = int(os.getenv("STOCK_OVERVIEW_CHUNK_SIZE", 500))
+
+# Instantané de l'aperçu du stock: mis à jour produit par produit à partir du journal des changements
+# (au plus MAX_PATCH produits, journal de CHANGE_LOG_SIZE versions), reconstruit entièrement après MAX_AGE secondes
+STOCK_OVERVIEW_MAX_AGE = float(os.getenv("STOCK_OVERVIEW_MAX_AGE", 300))
+STOCK_OVERVIEW_MAX_PATCH = int(os.getenv("STOCK_OVERVIEW_MAX_PATCH", 1000))
+STOCK_OVERVIEW_CHANGE_LOG_SIZE = int(os.getenv("STOCK_OVERVIEW_CHANGE_LOG_SIZE", 100000))
+
+# Cache-Control des rapports (secondes pendant lesquelles un client peut réutiliser sa copie sans revalider)
+REPORT_HTTP_MAX_AGE = int(os.getenv("REPORT_HTTP_MAX_AGE", 5))
+
+# Serveur de production (server.py): processus, threads par processus et arrêt gracieux (secondes)
+# SERVER_MODE: wsgi (Flask, threads) ou asgi (lectures asynchrones, voir async_app.py)
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+SERVER_BIND = os.getenv("SERVER_BIND", "0.0.0.0:5000")
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", (os.cpu_count() or 1) * 2 + 1))
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", 4))
+SERVER_TIMEOUT = int(os.getenv("SERVER_TIMEOUT", 60))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", 5))
+# Verrou de fichier qui désigne le processus chargé des tâches de fond de l'hôte (rapports, préchargement du stock)
+SERVER_LOCK_FILE = os.getenv("SERVER_LOCK_FILE", "/tmp/store_manager.host.lock")
+SERVER_ELECTION_INTERVAL = float(os.getenv("SERVER_ELECTION_INTERVAL", 5))
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "/tmp/store_manager_metrics")
+
+# Chemin de lecture asynchrone: taille des pools Redis et MySQL (aiomysql) de chaque processus
+ASYNC_REDIS_MAX_CONNECTIONS = int(os.getenv("ASYNC_REDIS_MAX_CONNECTIONS", 200))
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", 20))
+ASYNC_DB_POOL_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_POOL_MAX_OVERFLOW", 20))
+
+# Sérialisation JSON: orjson (par défaut, s'il est installé) ou json (bibliothèque standard)
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "orjson")
+
+# Traces OpenTelemetry (nécessite opentelemetry-sdk): exporteur none, console, file (un span JSON par ligne) ou otlp (collecteur)
+# TRACING_SAMPLE_RATIO: part des traces conservées quand la requête n'arrive pas déjà avec une décision (traceparent)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", 0.1))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "store_manager")
+TRACING_FILE = os.getenv("TRACING_FILE", "/tmp/store_manager.traces.jsonl")
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
@@ -4,15 +4,48 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
+import threading
+import time
 import mysql.connector
 import redis
 import config
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from instrumentation import InstrumentedRedis, instrument_engine
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 
 # optimization: on utilise un pool de connections
 # https://redis.io/docs/latest/develop/clients/pools-and-muxing/
 pool = redis.ConnectionPool(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True)
+# Pool sans décodage: les valeurs déjà sérialisées (JSON) sont lues en octets et envoyées telles quelles dans la réponse
+binary_pool = redis.ConnectionPool(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=False)
+
+# optimization: un seul engine SQLAlchemy (et donc un seul pool de connexions MySQL) par processus
+# https://docs.sqlalchemy.org/en/20/core/pooling.html
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+db_pool_checked_out = Gauge('db_pool_checked_out', 'MySQL connections currently checked out of the pool', multiprocess_mode='livesum')
+db_pool_idle = Gauge('db_pool_idle', 'MySQL connections idle in the pool', multiprocess_mode='livesum')
+db_pool_overflow = Gauge('db_pool_overflow', 'MySQL connections opened beyond pool_size', multiprocess_mode='livesum')
+db_pool_checkout_wait = Histogram('db_pool_checkout_wait_seconds', 'Time spent waiting for a MySQL connection from the pool')
+
+class InstrumentedQueuePool(QueuePool):
+    """ QueuePool that records how long callers wait to get a connection """
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - start_time)
+
+def _update_pool_gauges(db_pool):
+    db_pool_checked_out.set(db_pool.checkedout())
+    db_pool_idle.set(db_pool.checkedin())
+    db_pool_overflow.set(max(db_pool.overflow(), 0))
 
 def get_mysql_conn():
     """Get a MySQL connection using env variables"""
@@ -27,11 +60,48 @@ def get_mysql_conn():
 
 def get_redis_conn():
     """Get a Redis connection using env variables"""
-    return redis.Redis(connection_pool=pool, decode_responses=True)
+    return InstrumentedRedis(connection_pool=pool, decode_responses=True)
+
+def get_redis_binary_conn():
+    """Get a Redis connection that returns bytes (no decoding)"""
+    return InstrumentedRedis(connection_pool=binary_pool)
+
+def get_engine():
+    """Get the process-wide SQLAlchemy engine, created on first use"""
+    global _engine, _session_factory
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                connection_string = f'mysql+mysqlconnector://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}'
+                engine = create_engine(
+                    connection_string,
+                    connect_args={'auth_plugin': 'caching_sha2_password'},
+                    poolclass=InstrumentedQueuePool,
+                    pool_size=config.DB_POOL_SIZE,
+                    max_overflow=config.DB_POOL_MAX_OVERFLOW,
+                    pool_timeout=config.DB_POOL_TIMEOUT,
+                    pool_recycle=config.DB_POOL_RECYCLE,
+                    pool_pre_ping=config.DB_POOL_PRE_PING
+                )
+                for event_name in ('connect', 'checkout', 'checkin', 'close'):
+                    event.listen(engine.pool, event_name, lambda *args: _update_pool_gauges(engine.pool))
+                instrument_engine(engine)
+                _session_factory = sessionmaker(bind=engine)
+                _engine = engine
+    return _engine
 
 def get_sqlalchemy_session():
-    """Get an SQLAlchemy ORM session using env variables"""
-    connection_string = f'mysql+mysqlconnector://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}'
-    engine = create_engine(connection_string, connect_args={'auth_plugin': 'caching_sha2_password'})
-    Session = sessionmaker(bind=engine)
-    return Session()
\ No newline at end of file
+    """Get an SQLAlchemy ORM session bound to the pooled engine. The caller must close it."""
+    get_engine()
+    return _session_factory()
+
+# Session liée au thread courant (une par requête HTTP), libérée par remove_scoped_session() à la fin de la requête
+scoped_sqlalchemy_session = scoped_session(lambda: get_sqlalchemy_session())
+
+def get_scoped_session():
+    """Get the SQLAlchemy session of the current thread (request)"""
+    return scoped_sqlalchemy_session()
+
+def remove_scoped_session():
+    """Close the session of the current thread and return its connection to the pool"""
+    scoped_sqlalchemy_session.remove()
@@ -0,0 +1,45 @@
+"""
+HTTP caching helpers (ETag, Cache-Control, compression)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import gzip
+import hashlib
+from flask import Response
+
+def make_etag(body):
+    """Strong ETag of a response body (bytes)"""
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+def gzip_etag(etag):
+    """ETag of the gzip-encoded version of a body: a strong ETag identifies one exact sequence of bytes"""
+    return etag[:-1] + '-gzip"' if etag.endswith('"') else etag + '-gzip'
+
+def etag_matches(request, etag):
+    """True if the client already holds this version (If-None-Match)"""
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    # Une comparaison faible suffit pour une requête GET conditionnelle
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def cached_response(request, body, etag, mimetype='application/json', max_age=0, gzipped_body=None, response_class=Response):
+    """Build a response with ETag and Cache-Control, answering 304 if the client's copy is current.
+    gzipped_body, if given, is sent as is (with the ETag suffixed by -gzip) to clients that accept gzip.
+    response_class lets Quart use it too"""
+    gzipped = gzipped_body is not None and 'gzip' in request.headers.get('Accept-Encoding', '')
+    headers = {
+        'ETag': gzip_etag(etag) if gzipped else etag,
+        'Cache-Control': f"public, max-age={int(max_age)}, must-revalidate" if max_age else "no-cache",
+        'Vary': 'Accept-Encoding'
+    }
+    # Les deux versions ont le même contenu: l'une ou l'autre ETag suffit pour répondre 304
+    if etag_matches(request, etag) or (gzipped_body is not None and etag_matches(request, gzip_etag(etag))):
+        return response_class(status=304, headers=headers)
+    if gzipped:
+        headers['Content-Encoding'] = 'gzip'
+        return response_class(gzipped_body, status=200, mimetype=mimetype, headers=headers)
+    if body is None:
+        body = gzip.decompress(gzipped_body)
+    return response_class(body, status=200, mimetype=mimetype, headers=headers)
@@ -0,0 +1,176 @@
+"""
+Instrumentation (HTTP, MySQL and Redis timings on /metrics)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import contextvars
+import re
+import time
+import redis
+import redis.asyncio as aioredis
+from flask import request
+from prometheus_client import Gauge, Histogram
+from prometheus_flask_exporter import PrometheusMetrics
+from sqlalchemy import event
+
+# Les appels Redis et MySQL durent souvent moins d'une milliseconde: les buckets par défaut (5 ms et plus) ne les distinguent pas
+BACKEND_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+http_requests_in_flight = Gauge('http_requests_in_flight', 'HTTP requests being served', ['method', 'route'], multiprocess_mode='livesum')
+http_request_backend_duration = Histogram('http_request_backend_duration_seconds', 'Time each request spent in MySQL, in Redis and in Python (the rest)', ['route', 'backend'], buckets=REQUEST_BUCKETS)
+db_query_duration = Histogram('db_query_duration_seconds', 'Duration of the SQL statements', ['query'], buckets=BACKEND_BUCKETS)
+quart_http_request_duration = Histogram('quart_http_request_duration_seconds', 'Duration of the requests served by the asyncio read path', ['method', 'status', 'url_rule'], buckets=REQUEST_BUCKETS)
+redis_command_duration = Histogram('redis_command_duration_seconds', 'Duration of the Redis commands and pipelines (one round-trip each)', ['command'], buckets=BACKEND_BUCKETS)
+
+# Temps passé dans MySQL et Redis par la requête en cours (None en dehors d'une requête, p. ex. dans les workers)
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+_STATEMENT_VERBS = {'select', 'insert', 'update', 'delete', 'replace'}
+_STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)', re.IGNORECASE)
+
+def _add_request_time(backend, elapsed):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[backend] += elapsed
+
+def _route(current_request):
+    return current_request.url_rule.rule if current_request.url_rule else 'unmatched'
+
+def _start_timings(method, route):
+    http_requests_in_flight.labels(method, route).inc()
+    _request_timings.set({'started_at': time.perf_counter(), 'mysql': 0.0, 'redis': 0.0})
+
+def _observe_timings(method, route):
+    """ End the timings of the current request; returns its total duration, or None outside of a request """
+    timings = _request_timings.get()
+    if timings is None:
+        return None
+    _request_timings.set(None)
+    http_requests_in_flight.labels(method, route).dec()
+    total = time.perf_counter() - timings['started_at']
+    http_request_backend_duration.labels(route, 'mysql').observe(timings['mysql'])
+    http_request_backend_duration.labels(route, 'redis').observe(timings['redis'])
+    http_request_backend_duration.labels(route, 'python').observe(max(total - timings['mysql'] - timings['redis'], 0.0))
+    return total
+
+def init_app_metrics(app):
+    """ Export request duration histograms by route, method and status (prometheus-flask-exporter), the in-flight
+    requests, and how long each request spent in MySQL, Redis and Python. /metrics itself stays in store_manager """
+    # path=None: l'exporteur n'ajoute pas sa propre route /metrics (la nôtre agrège aussi les processus de server.py)
+    PrometheusMetrics(app, path=None, group_by='url_rule', buckets=REQUEST_BUCKETS, excluded_paths=['^/metrics$'])
+
+    @app.before_request
+    def start_request_timings():
+        if request.path != '/metrics':
+            _start_timings(request.method, _route(request))
+
+    @app.teardown_request
+    def observe_request_timings(exception=None):
+        _observe_timings(request.method, _route(request))
+
+def init_async_app_metrics(app):
+    """ Same metrics for the Quart read routes (SERVER_MODE=asgi). Their durations go to
+    quart_http_request_duration_seconds, with the labels of flask_http_request_duration_seconds """
+    from quart import g, request as async_request
+
+    @app.before_request
+    async def start_request_timings():
+        _start_timings(async_request.method, _route(async_request))
+
+    @app.after_request
+    async def record_response_status(response):
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    async def observe_request_timings(exception=None):
+        route = _route(async_request)
+        total = _observe_timings(async_request.method, route)
+        if total is not None:
+            status = g.get('response_status', 500)
+            quart_http_request_duration.labels(async_request.method, status, route).observe(total)
+
+def query_name(statement):
+    """ Short, bounded label for an SQL statement: its verb and first table (e.g. 'select orders') """
+    verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+    if verb not in _STATEMENT_VERBS:
+        return 'other'
+    match = _STATEMENT_TABLE.search(statement)
+    return f"{verb} {match.group(1).lower()}" if match else verb
+
+def instrument_engine(engine):
+    """ Time every statement run by an engine. A statement can be named with .execution_options(query_name=...) """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    name = context.execution_options.get('query_name') if context is not None else None
+    db_query_duration.labels(name or query_name(statement)).observe(elapsed)
+    _add_request_time('mysql', elapsed)
+
+def _handle_error(exception_context):
+    # L'instruction a échoué: after_cursor_execute ne sera pas appelé
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start_time'):
+        conn.info['query_start_time'].pop()
+
+def _observe_redis(command, start_time):
+    elapsed = time.perf_counter() - start_time
+    redis_command_duration.labels(command).observe(elapsed)
+    _add_request_time('redis', elapsed)
+
+def _command_name(args):
+    command = args[0] if args else 'unknown'
+    return (command.decode() if isinstance(command, bytes) else str(command)).split(' ', 1)[0].lower()
+
+class InstrumentedRedis(redis.Redis):
+    """ Redis client that times each command, and each pipeline as a whole (one round-trip) """
+
+    def execute_command(self, *args, **options):
+        start_time = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            _observe_redis(_command_name(args), start_time)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    """ Pipeline timed on execute() """
+
+    def execute(self, raise_on_error=True):
+        start_time = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            _observe_redis('multi' if self.transaction else 'pipeline', start_time)
+
+class InstrumentedAsyncRedis(aioredis.Redis):
+    """ asyncio twin of InstrumentedRedis """
+
+    async def execute_command(self, *args, **options):
+        start_time = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _observe_redis(_command_name(args), start_time)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class InstrumentedAsyncPipeline(aioredis.client.Pipeline):
+    """ asyncio pipeline timed on execute() """
+
+    async def execute(self, raise_on_error=True):
+        start_time = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _observe_redis('multi' if self.is_transaction else 'pipeline', start_time)
@@ -0,0 +1,130 @@
+"""
+Leaderboards (write-only model)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from collections import defaultdict
+from logger import Logger
+from sqlalchemy.sql import func
+from orders.models.order import Order
+from orders.models.order_item import OrderItem
+from orders.models.outbox_event import OutboxEvent
+from orders.commands.write_outbox import APPLIED_EVENTS_KEY, ORDER_CREATED, ORDER_DELETED, outbox_relay_lock
+from db import get_redis_conn, get_sqlalchemy_session
+from serialization import loads
+
+logger = Logger.get_instance("write_leaderboard")
+
+# optimization: les rapports sont maintenus de façon incrémentale dans des sorted sets Redis (ZINCRBY en O(log N))
+# https://redis.io/docs/latest/develop/data-types/sorted-sets/
+USER_SPENDING_KEY = "leaderboard:user_spending"
+PRODUCT_SALES_KEY = "leaderboard:product_sales"
+
+# Les mêmes classements sont aussi agrégés par jour ({clé}:AAAA-MM-JJ) pour répondre aux rapports sur une période
+def daily_key(key, day):
+    """ Name of the per-day bucket of a leaderboard (day is a date or an ISO date string) """
+    return f"{key}:{day}"
+
+def add_order_to_leaderboards(pipeline, user_id, total_amount, items, day=None):
+    """ Queue the leaderboard increments of an order (all-time and for its day) on a Redis pipeline """
+    for key in _keys_for(USER_SPENDING_KEY, day):
+        pipeline.zincrby(key, float(total_amount), user_id)
+    for item in items:
+        for key in _keys_for(PRODUCT_SALES_KEY, day):
+            pipeline.zincrby(key, int(item['quantity']), item['product_id'])
+
+def remove_order_from_leaderboards(pipeline, user_id, total_amount, items, day=None):
+    """ Queue the leaderboard decrements of an order (all-time and for its day) on a Redis pipeline """
+    for key in _keys_for(USER_SPENDING_KEY, day):
+        pipeline.zincrby(key, -float(total_amount), user_id)
+    for item in items:
+        for key in _keys_for(PRODUCT_SALES_KEY, day):
+            pipeline.zincrby(key, -int(item['quantity']), item['product_id'])
+    # Retirer les membres qui n'ont plus de ventes pour ne pas polluer les rapports
+    for key in _keys_for(USER_SPENDING_KEY, day) + _keys_for(PRODUCT_SALES_KEY, day):
+        pipeline.zremrangebyscore(key, '-inf', 0)
+
+def _keys_for(key, day):
+    return [key, daily_key(key, day)] if day else [key]
+
+def rebuild_leaderboards_from_mysql(lock_timeout=30):
+    """ Seed the Redis leaderboards (all-time and per day) from the orders already stored in MySQL.
+    The outbox relay is paused during the rebuild """
+    # Sans pause, un ZINCRBY du relais entre la lecture MySQL et le RENAME serait perdu
+    with outbox_relay_lock(lock_timeout) as acquired:
+        if not acquired:
+            raise TimeoutError(f"The outbox relay did not release its lock within {lock_timeout} seconds")
+        return _rebuild_leaderboards()
+
+def _rebuild_leaderboards():
+    r = get_redis_conn()
+    session = get_sqlalchemy_session()
+    try:
+        # Une seule transaction: les commandes et l'outbox sont lues dans le même instantané (REPEATABLE READ)
+        order_day = func.date(Order.created_at)
+        spending = session.query(
+            order_day,
+            Order.user_id,
+            func.sum(Order.total_amount)
+        ).group_by(order_day, Order.user_id).all()
+
+        sales = session.query(
+            order_day,
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity)
+        ).join(Order, Order.id == OrderItem.order_id)\
+         .group_by(order_day, OrderItem.product_id).all()
+
+        pending = session.query(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload)\
+            .filter(OutboxEvent.event_type.in_((ORDER_CREATED, ORDER_DELETED)))\
+            .order_by(OutboxEvent.id).all()
+    finally:
+        session.close()
+
+    buckets = {USER_SPENDING_KEY: defaultdict(lambda: defaultdict(float)), PRODUCT_SALES_KEY: defaultdict(lambda: defaultdict(float))}
+    for key, rows in ((USER_SPENDING_KEY, spending), (PRODUCT_SALES_KEY, sales)):
+        for day, member, score in rows:
+            buckets[key][key][member] += float(score)
+            if day:
+                buckets[key][daily_key(key, day)][member] += float(score)
+
+    # Les événements en attente sont déjà dans l'instantané, mais le relais les appliquera encore après la reconstruction:
+    # on retire leur effet (sauf pour ceux déjà appliqués à Redis, que le relais sautera)
+    already_applied = r.zmscore(APPLIED_EVENTS_KEY, [event_id for event_id, _, _ in pending]) if pending else []
+    for (_, event_type, payload), applied_at in zip(pending, already_applied):
+        if applied_at is not None:
+            continue
+        order = loads(payload)
+        sign = -1 if event_type == ORDER_CREATED else 1
+        day = order['created_at'][:10] if order.get('created_at') else None
+        for bucket_key in _keys_for(USER_SPENDING_KEY, day):
+            buckets[USER_SPENDING_KEY][bucket_key][order['user_id']] += sign * float(order['total_amount'])
+        for item in order['items']:
+            for bucket_key in _keys_for(PRODUCT_SALES_KEY, day):
+                buckets[PRODUCT_SALES_KEY][bucket_key][item['product_id']] += sign * int(item['quantity'])
+
+    # Écrire dans des clés temporaires puis RENAME pour que les lecteurs ne voient jamais un classement partiel
+    pipeline = r.pipeline(transaction=True)
+    for key, key_buckets in buckets.items():
+        # Le relais recrée les membres dont le score revient à zéro ici
+        key_buckets = {
+            bucket_key: {member: round(score, 2) for member, score in scores.items() if round(score, 2) > 0}
+            for bucket_key, scores in key_buckets.items()
+        }
+        key_buckets = {bucket_key: scores for bucket_key, scores in key_buckets.items() if scores}
+        # Les jours qui n'ont plus de commandes disparaissent (le SCAN est acceptable dans cette commande ponctuelle)
+        for stale_key in r.scan_iter(f"{key}:????-??-??"):
+            if stale_key not in key_buckets:
+                pipeline.delete(stale_key)
+        if key not in key_buckets:
+            pipeline.delete(key)
+        for bucket_key, scores in key_buckets.items():
+            tmp_key = f"{bucket_key}:rebuild"
+            pipeline.delete(tmp_key)
+            pipeline.zadd(tmp_key, scores)
+            pipeline.rename(tmp_key, bucket_key)
+    pipeline.execute()
+    users = len({member for _, member, _ in spending})
+    products = len({member for _, member, _ in sales})
+    logger.debug(f"Classements reconstruits: {users} utilisateurs, {products} produits ({len(pending)} événements en attente)")
+    return {'users': users, 'products': products}
@@ -4,16 +4,25 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 import time
-import json
+from datetime import datetime
 from logger import Logger
+from sqlalchemy import insert
 from orders.models.order import Order
+from orders.models.user import User
 from stocks.models.product import Product
 from orders.models.order_item import OrderItem
-from stocks.commands.write_stock import check_in_items_to_stock, check_out_items_from_stock, update_stock_redis
+from stocks.commands.write_stock import STOCK_READY_KEY, apply_stock_deltas, check_in_items_to_stock, check_out_items_from_stock, get_stock_levels, populate_redis_from_mysql, update_stock_redis
+from orders.commands.write_leaderboard import add_order_to_leaderboards, remove_order_from_leaderboards
+from stocks.queries.read_product import get_products_by_ids
+from orders.commands.write_outbox import ORDER_CREATED, ORDER_DELETED, add_outbox_event, add_outbox_events, notify_outbox_relay
 from db import get_sqlalchemy_session, get_redis_conn
+from cache import missing_key
+from serialization import dumps_str
+from tracing import span, traced
 
 logger = Logger.get_instance("add_order")
 
+@traced("add_order")
 def add_order(user_id: int, items: list):
     """Insert order with items in MySQL, keep Redis in sync"""
     if not items:
@@ -25,15 +34,16 @@ def add_order(user_id: int, items: list):
     try:
         start_time = time.time()
         product_prices = {}
-        products = session.query(Product).filter(Product.id.in_(product_ids)).all()
+        # optimization: les prix viennent du cache en mémoire des produits
+        with span("add_order.product_prices", products=len(product_ids)):
+            products = get_products_by_ids(product_ids)
 
         if len(products) != len(set(product_ids)):
             # Find which one is missing for the error message
-            found_ids = {p.id for p in products}
-            missing = set(product_ids) - found_ids
+            missing = set(product_ids) - set(products)
             raise ValueError(f"Product IDs {missing} not found in database.")
 
-        product_prices = {p.id: p.price for p in products}
+        product_prices = {pid: p['price'] for pid, p in products.items()}
         # for product in products:
         #     product_prices[product.id] = product.price
 
@@ -56,9 +66,11 @@ def add_order(user_id: int, items: list):
                 'unit_price': unit_price
             })
 
-        new_order = Order(user_id=user_id, total_amount=total_amount)
+        created_at = datetime.now()
+        new_order = Order(user_id=user_id, total_amount=total_amount, created_at=created_at)
         session.add(new_order)
-        session.flush() 
+        with span("add_order.flush"):
+            session.flush() 
         
         order_id = new_order.id
 
@@ -71,14 +83,28 @@ def add_order(user_id: int, items: list):
             )
             session.add(order_item)
 
-        # Update stock
-        check_out_items_from_stock(session, order_items)
+        # Update stock (l'autoflush insère aussi les lignes de la commande)
+        with span("add_order.stock_mysql", items=len(order_items)):
+            check_out_items_from_stock(session, order_items)
 
-        session.commit()
+        # L'insertion de la commande dans Redis est confiée au relais de l'outbox (même transaction que la commande)
+        add_outbox_event(session, ORDER_CREATED, {
+            'order_id': order_id,
+            'user_id': user_id,
+            'total_amount': float(total_amount),
+            'items': [{'product_id': item['product_id'], 'quantity': item['quantity']} for item in items],
+            'created_at': created_at.isoformat(timespec='seconds')
+        })
 
-        # Insert order into Redis
+        # Réserver le stock dans Redis avant le commit: le script refuse la survente de façon atomique
         update_stock_redis(order_items, '-')
-        add_order_to_redis(order_id, user_id, total_amount, items)
+        try:
+            with span("add_order.commit"):
+                session.commit()
+        except Exception:
+            update_stock_redis(order_items, '+')
+            raise
+        notify_outbox_relay()
         end_time = time.time()
         logger.debug(f"Executed in {end_time - start_time} seconds")
         return order_id
@@ -90,22 +116,169 @@ def add_order(user_id: int, items: list):
     finally:
         session.close()
 
+def add_orders_batch(orders: list, atomic=False):
+    """Insert many orders with one transaction (group commit), keep Redis in sync with one pipeline.
+    Returns one result per order: {'index', 'order_id'} or {'index', 'error'}"""
+    results = [None] * len(orders)
+    product_ids = {item.get('product_id') for order in orders for item in (order.get('items') or []) if isinstance(item, dict) and isinstance(item.get('product_id'), int)}
+    user_ids = {order.get('user_id') for order in orders if isinstance(order.get('user_id'), int)}
+    session = get_sqlalchemy_session()
+
+    try:
+        start_time = time.time()
+        # Une seule requête IN pour valider tous les articles et tous les utilisateurs du lot
+        products = {p.id: p for p in session.query(Product).filter(Product.id.in_(product_ids)).all()}
+        known_users = {row[0] for row in session.query(User.id).filter(User.id.in_(user_ids)).all()}
+        available = get_stock_levels(session, products.keys(), for_update=True)
+
+        accepted = []
+        stock_deltas = {}
+        for index, order in enumerate(orders):
+            user_id = order.get('user_id')
+            items = order.get('items') or []
+            try:
+                if not isinstance(user_id, int) or user_id not in known_users:
+                    raise ValueError(f"User ID {user_id} not found in database.")
+                if not items:
+                    raise ValueError("Cannot create order. An order must have 1 or more items.")
+                quantities = {}
+                for item in items:
+                    if not isinstance(item, dict):
+                        raise ValueError(f"Invalid order item {item}.")
+                    pid = item.get('product_id')
+                    qty = item.get('quantity')
+                    if not isinstance(pid, int) or pid not in products:
+                        raise ValueError(f"Product ID {pid} not found in database.")
+                    if not isinstance(qty, int) or qty <= 0:
+                        raise ValueError(f"Invalid quantity {qty} for product ID {pid}.")
+                    quantities[pid] = quantities.get(pid, 0) + qty
+                short = [pid for pid, qty in quantities.items() if available.get(pid, 0) < qty]
+                if short:
+                    raise ValueError(f"Insufficient stock for product IDs {short}")
+            except ValueError as e:
+                results[index] = {'index': index, 'error': str(e)}
+                continue
+
+            for pid, qty in quantities.items():
+                available[pid] -= qty
+                stock_deltas[pid] = stock_deltas.get(pid, 0) - qty
+            order_items = [
+                {'product_id': item['product_id'], 'quantity': item['quantity'], 'unit_price': products[item['product_id']].price}
+                for item in items
+            ]
+            total_amount = sum(item['unit_price'] * item['quantity'] for item in order_items)
+            accepted.append((index, user_id, total_amount, order_items))
+
+        failed = len(orders) - len(accepted)
+        if not accepted or (atomic and failed):
+            session.rollback()
+            for index, _, _, _ in accepted:
+                results[index] = {'index': index, 'error': "Batch rejected: at least one order is invalid."}
+            return results
+
+        # Les commandes passent par l'ORM: le flush relit l'id réel de chaque ligne. Un INSERT multi-lignes ne
+        # garantit pas des id consécutifs (innodb_autoinc_lock_mode=2, par défaut depuis MySQL 8.0)
+        created_at = datetime.now()
+        new_orders = [
+            Order(user_id=user_id, total_amount=total_amount, created_at=created_at)
+            for _, user_id, total_amount, _ in accepted
+        ]
+        session.add_all(new_orders)
+        session.flush()
+        order_ids = [order.id for order in new_orders]
+
+        session.execute(insert(OrderItem).values([
+            {'order_id': order_id, 'product_id': item['product_id'], 'quantity': item['quantity'], 'unit_price': item['unit_price']}
+            for order_id, (_, _, _, order_items) in zip(order_ids, accepted)
+            for item in order_items
+        ]))
+        apply_stock_deltas(session, stock_deltas)
+        add_outbox_events(session, ORDER_CREATED, [
+            {
+                'order_id': order_id,
+                'user_id': user_id,
+                'total_amount': float(total_amount),
+                'items': [{'product_id': item['product_id'], 'quantity': item['quantity']} for item in order_items],
+                'created_at': created_at.isoformat(timespec='seconds')
+            }
+            for order_id, (_, user_id, total_amount, order_items) in zip(order_ids, accepted)
+        ])
+        session.commit()
+        notify_outbox_relay()
+        for order_id, (index, _, _, _) in zip(order_ids, accepted):
+            results[index] = {'index': index, 'order_id': order_id}
+
+        # Les commandes sont validées dans MySQL: un échec de Redis ne doit plus renvoyer d'erreur (le client renverrait le lot)
+        try:
+            sync_batch_stock_redis(stock_deltas)
+        except Exception as e:
+            logger.error(f"Stock Redis non synchronisé après le lot, il sera recopié depuis MySQL: {e}")
+            invalidate_redis_stock()
+
+        end_time = time.time()
+        logger.debug(f"Batch of {len(orders)} orders ({failed} failed) executed in {end_time - start_time} seconds")
+        return results
+
+    except Exception as e:
+        logger.debug("Error:" + str(e))
+        session.rollback()
+        raise e
+    finally:
+        session.close()
+
+def sync_batch_stock_redis(stock_deltas):
+    """Apply the stock deltas of a committed batch to Redis with one pipeline (the orders go through the outbox)"""
+    r = get_redis_conn()
+    if r.exists(STOCK_READY_KEY):
+        pipeline = r.pipeline(transaction=True)
+        for pid, delta in stock_deltas.items():
+            pipeline.hincrby(f"stock:{pid}", "quantity", delta)
+        pipeline.execute()
+    else:
+        populate_redis_from_mysql(r)
+
+def invalidate_redis_stock():
+    """Drop the sync marker: the next stock update copies the stock from MySQL again"""
+    try:
+        get_redis_conn().delete(STOCK_READY_KEY)
+    except Exception as e:
+        logger.error(f"Impossible d'invalider le stock Redis: {e}")
+
+@traced("delete_order")
 def delete_order(order_id: int):
     """Delete order in MySQL, keep Redis in sync"""
     session = get_sqlalchemy_session()
     try:
-        order = session.query(Order).filter(Order.id == order_id).first()
+        with span("delete_order.load"):
+            order = session.query(Order).filter(Order.id == order_id).first()
+            order_items = session.query(OrderItem).filter(OrderItem.order_id == order_id).all() if order else []
         if order:
 
             # MySQL
-            order_items = session.query(OrderItem).filter(OrderItem.order_id == order_id).all()
+            user_id = order.user_id
+            total_amount = order.total_amount
+            created_at = order.created_at
+            items = [{'product_id': item.product_id, 'quantity': item.quantity} for item in order_items]
             session.delete(order)
-            check_in_items_to_stock(session, order_items)
-            session.commit()
+            with span("delete_order.stock_mysql", items=len(order_items)):
+                check_in_items_to_stock(session, order_items)
+            add_outbox_event(session, ORDER_DELETED, {
+                'order_id': order_id,
+                'user_id': user_id,
+                'total_amount': float(total_amount),
+                'items': items,
+                'created_at': created_at.isoformat(timespec='seconds') if created_at else None
+            })
 
             # Redis
-            update_stock_redis(order_items, '+')
-            delete_order_from_redis(order_id)
+            update_stock_redis(items, '+')
+            try:
+                with span("delete_order.commit"):
+                    session.commit()
+            except Exception:
+                update_stock_redis(items, '-', enforce=False)
+                raise
+            notify_outbox_relay()
             return 1  
         else:
             return 0  
@@ -116,20 +289,27 @@ def delete_order(order_id: int):
     finally:
         session.close()
 
-def add_order_to_redis(order_id, user_id, total_amount, items):
-    """Insert order to Redis"""
-    r = get_redis_conn()
-    r.hset(
-        f"order:{order_id}",
-        mapping={
-            "user_id": user_id,
-            "total_amount": float(total_amount),
-            "items": json.dumps(items)
-        }
-    )
-
-def delete_order_from_redis(order_id):
-    """Delete order from Redis"""
-    r = get_redis_conn()
-    r.delete(f"order:{order_id}")
+def add_order_to_redis(pipeline, order_id, user_id, total_amount, items, created_at=None):
+    """Queue the insertion of an order in Redis and the leaderboard updates on a (transactional) pipeline"""
+    order = {
+        "user_id": user_id,
+        "total_amount": float(total_amount),
+        "items": dumps_str(items)
+    }
+    if created_at:
+        order["created_at"] = created_at
+    pipeline.hset(f"order:{order_id}", mapping=order)
+    # Le hash a pu être réhydraté (avec expiration) par une lecture faite avant que l'événement soit relayé
+    pipeline.persist(f"order:{order_id}")
+    # Cette lecture a aussi pu mémoriser la commande comme inexistante
+    pipeline.delete(missing_key('order', order_id))
+    add_order_to_leaderboards(pipeline, user_id, total_amount, items, _day_of(created_at))
+
+def delete_order_from_redis(pipeline, order_id, user_id, total_amount, items, created_at=None):
+    """Queue the deletion of an order from Redis and the leaderboard updates on a (transactional) pipeline"""
+    pipeline.delete(f"order:{order_id}")
+    remove_order_from_leaderboards(pipeline, user_id, total_amount, items, _day_of(created_at))
 
+def _day_of(created_at):
+    # created_at est une date ISO (AAAA-MM-JJTHH:MM:SS): les 10 premiers caractères donnent le jour
+    return created_at[:10] if created_at else None
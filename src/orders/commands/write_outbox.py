@@ -0,0 +1,55 @@
+"""
+Outbox (write-only model)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+from contextlib import contextmanager
+from sqlalchemy import insert, text
+from db import get_engine
+from orders.models.outbox_event import OutboxEvent
+from serialization import dumps_str
+
+# optimization: transactional outbox. Les événements sont écrits dans la même transaction MySQL que la commande,
+# puis un relais (workers/outbox_relay.py) les applique à Redis en arrière-plan.
+# https://microservices.io/patterns/data/transactional-outbox.html
+ORDER_CREATED = "order_created"
+ORDER_DELETED = "order_deleted"
+# Produits dont le stock a changé (version et journal des changements de l'aperçu du stock)
+STOCK_CHANGED = "stock_changed"
+
+# Identifiants des événements déjà appliqués à Redis (score = timestamp), pour rejouer un lot sans double application
+APPLIED_EVENTS_KEY = "outbox:applied"
+
+# Verrou nommé MySQL pris par le relais pour chaque lot, et par la reconstruction des classements pour le mettre en pause
+OUTBOX_RELAY_LOCK = "outbox_relay"
+
+# Réveille le relais de ce processus dès qu'un événement est commité, sans attendre le prochain polling
+outbox_wakeup = threading.Event()
+
+def add_outbox_event(session, event_type, payload):
+    """ Add an event to the outbox, in the caller's transaction """
+    session.add(OutboxEvent(event_type=event_type, payload=dumps_str(payload)))
+
+def add_outbox_events(session, event_type, payloads):
+    """ Add many events to the outbox with a multi-row INSERT, in the caller's transaction """
+    if payloads:
+        session.execute(insert(OutboxEvent).values([
+            {'event_type': event_type, 'payload': dumps_str(payload)} for payload in payloads
+        ]))
+
+def notify_outbox_relay():
+    """ Wake up the outbox relay after a commit """
+    outbox_wakeup.set()
+
+@contextmanager
+def outbox_relay_lock(timeout=0):
+    """ Hold the MySQL named lock of the outbox relay; yields False if it could not be taken within timeout seconds.
+    The lock has its own connection: MySQL releases it if the process dies """
+    with get_engine().connect() as conn:
+        acquired = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {'name': OUTBOX_RELAY_LOCK, 'timeout': timeout}).scalar() == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': OUTBOX_RELAY_LOCK})
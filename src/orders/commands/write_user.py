@@ -6,6 +6,7 @@ Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 
 from orders.models.user import User
 from db import get_sqlalchemy_session
+from cache import publish_invalidation
 
 def add_user(name: str, email: str):
     """Insert user with items in MySQL"""
@@ -19,6 +20,8 @@ def add_user(name: str, email: str):
         session.add(new_user)
         session.flush() 
         session.commit()
+        # L'identifiant a pu être réutilisé (base réinitialisée): on retire toute entrée en cache
+        publish_invalidation('users', new_user.id)
         return new_user.id
     except Exception as e:
         session.rollback()
@@ -34,6 +37,7 @@ def delete_user(user_id: int):
         if user:
             session.delete(user)
             session.commit()
+            publish_invalidation('users', user_id)
             return 1  
         else:
             return 0  
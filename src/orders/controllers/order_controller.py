@@ -4,9 +4,13 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
+import config
+from datetime import date, timedelta
 from flask import jsonify
-from orders.commands.write_order import add_order, delete_order
-from orders.queries.read_order import get_order_by_id, get_best_selling_products, get_highest_spending_users
+from orders.commands.write_order import add_order, add_orders_batch, delete_order
+from orders.queries.read_order import get_order_by_id, get_orders_by_ids, get_report_etag, get_serialized_report
+from http_cache import cached_response, etag_matches, make_etag
+from bulk import bulk_result, parse_ids
 
 def create_order(request):
     """Create order, use WriteOrder model"""
@@ -19,6 +23,25 @@ def create_order(request):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def create_orders_batch(request):
+    """Create many orders at once, use WriteOrder model. Each order succeeds or fails on its own unless 'atomic' is set"""
+    payload = request.get_json() or {}
+    orders = payload.get('orders')
+    atomic = bool(payload.get('atomic', False))
+    if not isinstance(orders, list) or not orders or not all(isinstance(order, dict) for order in orders):
+        return jsonify({'error': "Cannot create orders. 'orders' must be a non-empty list of orders."}), 400
+    if len(orders) > config.ORDER_BATCH_MAX_SIZE:
+        return jsonify({'error': f"Cannot create more than {config.ORDER_BATCH_MAX_SIZE} orders per batch."}), 400
+    try:
+        results = add_orders_batch(orders, atomic)
+        created = sum(1 for result in results if 'order_id' in result)
+        failed = len(results) - created
+        # 201: tout est créé, 207: création partielle, 400: rien n'est créé
+        status = 201 if not failed else (207 if created else 400)
+        return jsonify({'created': created, 'failed': failed, 'results': results}), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 def remove_order(order_id):
     """Delete order, use WriteOrder model"""
     try:
@@ -37,10 +60,49 @@ def get_order(order_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
-def get_report_highest_spending_users(skip_cache=False):
-    """Get orders report: highest spending users"""
-    return get_highest_spending_users(skip_cache)
+def get_report(request, report, window=None):
+    """Get a report as an HTTP response with ETag; a client whose copy is current gets 304 without the report being read"""
+    start_day, end_day = window or (None, None)
+    try:
+        etag = get_report_etag(report, start_day, end_day)
+        if etag and etag_matches(request, etag):
+            return cached_response(request, None, etag, max_age=config.REPORT_HTTP_MAX_AGE)
+        body, etag = get_serialized_report(report, start_day, end_day)
+        return cached_response(request, body, etag or make_etag(body), max_age=config.REPORT_HTTP_MAX_AGE)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_report_window(args):
+    """Read the report period from the query string: from/to (AAAA-MM-JJ) or window=7d. None means all-time"""
+    window = args.get('window')
+    start = args.get('from')
+    end = args.get('to')
+    if not window and not start and not end:
+        return None
+    today = date.today()
+    if window:
+        if not window.endswith('d') or not window[:-1].isdigit() or int(window[:-1]) < 1:
+            raise ValueError("Invalid window. Expected a number of days, e.g. window=7d.")
+        start_day, end_day = today - timedelta(days=int(window[:-1]) - 1), today
+    else:
+        try:
+            start_day = date.fromisoformat(start) if start else today - timedelta(days=config.REPORT_MAX_WINDOW_DAYS - 1)
+            end_day = date.fromisoformat(end) if end else today
+        except ValueError:
+            raise ValueError("Invalid date. Expected from/to as YYYY-MM-DD.")
+    if start_day > end_day:
+        raise ValueError("Invalid period: 'from' is after 'to'.")
+    if (end_day - start_day).days + 1 > config.REPORT_MAX_WINDOW_DAYS:
+        raise ValueError(f"Invalid period: a report can cover at most {config.REPORT_MAX_WINDOW_DAYS} days.")
+    return start_day, end_day
 
-def get_report_best_selling_products(skip_cache=False):
-    """Get orders report: best selling products"""
-    return get_best_selling_products(skip_cache)
\ No newline at end of file
+def get_orders(request):
+    """Get several orders at once (?ids=1,2,3), in request order, with the list of missing IDs"""
+    try:
+        ids = parse_ids(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(bulk_result(ids, get_orders_by_ids(ids))), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -6,7 +6,8 @@ Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 
 from flask import jsonify
 from orders.commands.write_user import add_user, delete_user
-from orders.queries.read_user import get_user_by_id
+from orders.queries.read_user import get_user_by_id, get_users_by_ids
+from bulk import bulk_result, parse_ids
 
 def create_user(request):
     """Create user, use WriteUser model"""
@@ -35,4 +36,15 @@ def get_user(user_id):
         user = get_user_by_id(user_id)
         return jsonify(user), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+def get_users(request):
+    """Get several users at once (?ids=1,2,3), in request order, with the list of missing IDs"""
+    try:
+        ids = parse_ids(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(bulk_result(ids, get_users_by_ids(ids))), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -3,28 +3,125 @@ Orders (read-only model)
 SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
-import json
-import time
-from db import get_redis_conn, get_sqlalchemy_session
-from collections import defaultdict
+import config
+from db import get_redis_conn, get_scoped_session, get_sqlalchemy_session
 from logger import Logger
+from prometheus_client import Counter
+from datetime import datetime, timedelta
+from orders.commands.write_leaderboard import USER_SPENDING_KEY, PRODUCT_SALES_KEY, daily_key
+from cache import ReportCache, missing_key, read_tier_requests
+from serialization import dumps_str
+from tracing import traced
 from orders.models.order import Order
 from orders.models.order_item import OrderItem
+from sqlalchemy import select
 from sqlalchemy.sql import func
 
 logger = Logger.get_instance("read_order")
 
+# TTL, stale-while-revalidate et coalescence des reconstructions: voir src/cache.py
+report_cache = ReportCache()
+
+order_read_model_drift = Counter('order_read_model_drift', 'Orders found in MySQL but missing from the Redis read model, older than the relay lag bound')
+order_read_model_relay_lag = Counter('order_read_model_relay_lag', 'Orders read from MySQL because the outbox relay had not written them to Redis yet')
+
 def get_order_by_id(order_id):
     """Get order by ID from Redis"""
+    return get_orders_by_ids([order_id]).get(order_id, {})
+
+def get_orders_by_ids(order_ids):
+    """Get several orders from Redis with one pipelined HGETALL, as a dict keyed by order ID.
+    Orders missing from Redis are read from MySQL and written back to Redis"""
     r = get_redis_conn()
-    raw_order = r.hgetall(f"order:{order_id}")
-    order = {}
-    for key, value in raw_order.items():
-        found_key = key.decode('utf-8') if isinstance(key, bytes) else key
-        found_value = value.decode('utf-8') if isinstance(value, bytes) else value
-        order[found_key] = found_value
-    return order
+    pipeline = r.pipeline(transaction=False)
+    queue_order_reads(pipeline, order_ids)
+    orders = {}
+    not_in_redis = apply_order_replies(orders, order_ids, pipeline.execute())
+    if not_in_redis:
+        orders.update(get_orders_from_mysql(r, not_in_redis))
+    return orders
+
+def get_orders_from_mysql(r, order_ids):
+    """Read orders and their items from MySQL with one joined query, then rehydrate their Redis hashes"""
+    session = get_scoped_session()
+    rows = session.execute(orders_statement(order_ids)).all()
+    pipeline = r.pipeline(transaction=False)
+    orders = apply_order_rows(pipeline, order_ids, rows)
+    pipeline.execute()
+    return orders
+
+# Étapes de get_orders_by_ids, partagées avec la version asynchrone (read_order_async.py)
+def queue_order_reads(pipeline, order_ids):
+    """Queue the reads of the order hashes and of their negative cache markers on a Redis pipeline"""
+    for order_id in order_ids:
+        pipeline.hgetall(f"order:{order_id}")
+        pipeline.exists(missing_key('order', order_id))
+
+def apply_order_replies(orders, order_ids, replies):
+    """Add the orders found in Redis to orders; returns the IDs Redis knows nothing about"""
+    not_in_redis = []
+    for order_id, order, known_missing in zip(order_ids, replies[0::2], replies[1::2]):
+        if order:
+            read_tier_requests.labels('order', 'redis').inc()
+            orders[order_id] = order
+        elif known_missing:
+            read_tier_requests.labels('order', 'negative').inc()
+        else:
+            not_in_redis.append(order_id)
+    return not_in_redis
+
+def orders_statement(order_ids):
+    """SELECT of several orders joined with their items"""
+    return select(Order, OrderItem)\
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)\
+        .where(Order.id.in_(order_ids))\
+        .order_by(Order.id, OrderItem.id)
+
+def apply_order_rows(pipeline, order_ids, rows):
+    """Build the orders read from MySQL as Redis hashes, and queue their rehydration (or their absence) in Redis"""
+    found = {}
+    found_created_at = {}
+    for order, order_item in rows:
+        if order.id not in found:
+            found_created_at[order.id] = order.created_at
+            found[order.id] = {
+                'user_id': order.user_id,
+                'total_amount': float(order.total_amount),
+                'items': [],
+                'created_at': order.created_at.isoformat() if order.created_at else None
+            }
+        if order_item is not None:
+            found[order.id]['items'].append({'product_id': order_item.product_id, 'quantity': order_item.quantity})
 
+    orders = {}
+    for order_id in order_ids:
+        read_tier_requests.labels('order', 'mysql').inc()
+        data = found.get(order_id)
+        if data is None:
+            pipeline.set(missing_key('order', order_id), 1, ex=config.NEGATIVE_CACHE_TTL)
+            continue
+        # Une commande récente n'a peut-être pas encore été relayée (outbox): ce n'est pas une dérive du modèle de lecture
+        created_at = found_created_at.get(order_id)
+        if created_at is not None and datetime.now() - created_at < timedelta(seconds=config.ORDER_RELAY_LAG_BOUND):
+            order_read_model_relay_lag.inc()
+        else:
+            order_read_model_drift.inc()
+        order = {
+            'user_id': str(data['user_id']),
+            'total_amount': str(data['total_amount']),
+            'items': dumps_str(data['items'])
+        }
+        if data['created_at']:
+            order['created_at'] = data['created_at']
+        # Le hash réhydraté expire: s'il a été réécrit ici juste après une suppression, il ne survit pas longtemps
+        pipeline.hset(f"order:{order_id}", mapping=order)
+        pipeline.expire(f"order:{order_id}", config.ORDER_REHYDRATE_TTL)
+        orders[order_id] = order
+    if found:
+        logger.debug(f"{len(found)} commandes absentes de Redis relues depuis MySQL")
+    return orders
+
+@traced("report.highest_spenders.mysql")
 def get_highest_spending_users_mysql():
     """Get report of highest spending users from MySQL"""
     session = get_sqlalchemy_session()
@@ -49,6 +146,7 @@ def get_highest_spending_users_mysql():
     finally:
         session.close()
 
+@traced("report.best_sellers.mysql")
 def get_best_selling_products_mysql():
     """Get report of best selling products by quantity sold from MySQL"""
     session = get_sqlalchemy_session()
@@ -75,90 +173,102 @@ def get_best_selling_products_mysql():
     finally:
         session.close()
 
-def get_highest_spending_users_redis(skip_cache=False):
-    """Get report of highest spending users from Redis"""
-    result = []
+def get_top_from_leaderboard(key, limit, start_day=None, end_day=None):
+    """Get the top members of a leaderboard, all-time or between two days (inclusive) by merging the per-day buckets"""
     r = get_redis_conn()
-    cached = r.get("report:highest_spenders")
-    logger.debug(f"Dans le cache: {cached}")
-    if cached and not skip_cache:
-        return json.loads(cached)
-
-    try: 
-        logger.debug("Créer le rapport highest_spenders")
-        limit = 10
-        order_keys = r.keys("order:*")
-        spending = defaultdict(float)
-        
-        for key in order_keys:
-            order_data = r.hgetall(key)
-            if "user_id" in order_data and "total_amount" in order_data:
-                user_id = int(order_data["user_id"])
-                total = float(order_data["total_amount"])
-                spending[user_id] += total
-
-        # Trier par total dépensé (décroissant), limite X
-        highest_spending_users = sorted(spending.items(), key=lambda x: x[1], reverse=True)[:limit]
-        for user in highest_spending_users:
-            result.append({
-                "user_id": user[0],
-                "total_expense": round(user[1], 2)
-            })
-        logger.debug(f"Résultat JSON: {result}")
-        r.set('report:highest_spenders', json.dumps(result))
+    if start_day is None:
+        return r.zrevrange(key, 0, limit - 1, withscores=True)
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    window_key = f"{key}:window:{start_day}:{end_day}"
+    # ZUNIONSTORE fusionne les classements journaliers côté Redis, la clé temporaire est supprimée dans la même transaction
+    pipeline = r.pipeline(transaction=True)
+    pipeline.zunionstore(window_key, [daily_key(key, day) for day in days])
+    pipeline.zrevrange(window_key, 0, limit - 1, withscores=True)
+    pipeline.delete(window_key)
+    return pipeline.execute()[1]
+
+@traced("report.highest_spenders")
+def get_highest_spending_users_redis(start_day=None, end_day=None):
+    """Get report of highest spending users from Redis, optionally restricted to a period"""
+    logger.debug("Créer le rapport highest_spenders")
+    limit = 10
+    # Le classement est maintenu par add_order/delete_order, un seul ZREVRANGE (ou ZUNIONSTORE sur une période) suffit
+    highest_spending_users = get_top_from_leaderboard(USER_SPENDING_KEY, limit, start_day, end_day)
+    return [
+        {
+            "user_id": int(user_id),
+            "total_expense": round(total_expense, 2)
+        }
+        for user_id, total_expense in highest_spending_users
+    ]
+
+@traced("report.best_sellers")
+def get_best_selling_products_redis(start_day=None, end_day=None):
+    """Get report of best selling products by quantity sold from Redis, optionally restricted to a period"""
+    logger.debug("Créer le rapport best_sellers")
+    limit = 10
+    # Le classement est maintenu par add_order/delete_order, un seul ZREVRANGE (ou ZUNIONSTORE sur une période) suffit
+    best_selling = get_top_from_leaderboard(PRODUCT_SALES_KEY, limit, start_day, end_day)
+    return [
+        {
+            "product_id": int(product_id),
+            "quantity_sold": int(quantity_sold)
+        }
+        for product_id, quantity_sold in best_selling
+    ]
 
+def get_highest_spending_users(skip_cache=False, start_day=None, end_day=None):
+    """Get report of highest spending users (cached, skip_cache forces a rebuild)"""
+    try:
+        return report_cache.get(
+            _report_key("report:highest_spenders", start_day, end_day),
+            lambda: get_highest_spending_users_redis(start_day, end_day),
+            force_refresh=skip_cache
+        )
     except Exception as e:
         return {'error': str(e)}
-    finally:
-        return result
 
-def get_best_selling_products_redis(skip_cache=False):
-    """Get report of best selling products by quantity sold from Redis"""
-    result = []
-    r = get_redis_conn()
-    cached = r.get("report:best_sellers")
-    logger.debug(f"Dans le cache: {cached}")
-    if cached and not skip_cache:
-        return json.loads(cached)
-    
+def get_best_selling_products(skip_cache=False, start_day=None, end_day=None):
+    """Get report of best selling products (cached, skip_cache forces a rebuild)"""
     try:
-        logger.debug("Créer le rapport best_sellers")
-        limit = 10
-        order_keys = r.keys("order:*")
-        product_sales = defaultdict(int)
-        
-        for order_key in order_keys:
-            order_data = r.hgetall(order_key)
-            if "items" in order_data:
-                try:
-                    products = json.loads(order_data["items"])
-                except Exception:
-                    continue
-
-                for item in products:
-                    product_id = int(item.get("product_id", 0))
-                    quantity = int(item.get("quantity", 0))
-                    product_sales[product_id] += quantity
-
-        # Trier par total vendu (décroissant), limite X
-        best_selling = sorted(product_sales.items(), key=lambda x: x[1], reverse=True)[:limit]
-        for product in best_selling:
-            result.append({
-                "product_id": product[0],
-                "quantity_sold": product[1]
-            })
-        logger.debug(f"Résultat JSON: {result}")
-        r.set('report:best_sellers', json.dumps(result))
-
+        return report_cache.get(
+            _report_key("report:best_sellers", start_day, end_day),
+            lambda: get_best_selling_products_redis(start_day, end_day),
+            force_refresh=skip_cache
+        )
     except Exception as e:
         return {'error': str(e)}
-    finally:
-        return result
 
-def get_highest_spending_users(skip_cache=False):
-    """Get report of highest spending users"""
-    return get_highest_spending_users_redis(skip_cache)
+# Rapports servis en HTTP: préfixe de leur clé de cache et fonction qui les construit
+REPORTS = {
+    'highest_spenders': ("report:highest_spenders", get_highest_spending_users_redis),
+    'best_sellers': ("report:best_sellers", get_best_selling_products_redis),
+}
+
+def get_report_key(report, start_day=None, end_day=None):
+    """Cache key of a report served over HTTP"""
+    return _report_key(REPORTS[report][0], start_day, end_day)
+
+def get_report_etag(report, start_day=None, end_day=None):
+    """Get the ETag of a cached report if it is still fresh, None otherwise"""
+    return report_cache.get_fresh_etag(get_report_key(report, start_day, end_day))
+
+def get_serialized_report(report, start_day=None, end_day=None):
+    """Get a report as cached (JSON bytes) with its ETag, without decoding it"""
+    builder = REPORTS[report][1]
+    return report_cache.get_serialized(
+        get_report_key(report, start_day, end_day),
+        lambda: builder(start_day, end_day)
+    )
+
+def refresh_report(report, start_day=None, end_day=None):
+    """Rebuild a cached report now. Unlike get_highest_spending_users/get_best_selling_products, errors are raised"""
+    builder = REPORTS[report][1]
+    report_cache.get_serialized(
+        get_report_key(report, start_day, end_day),
+        lambda: builder(start_day, end_day),
+        force_refresh=True
+    )
 
-def get_best_selling_products(skip_cache=False):
-    """Get report of best selling products"""
-    return get_best_selling_products_redis(skip_cache)
\ No newline at end of file
+def _report_key(key, start_day, end_day):
+    return f"{key}:{start_day}:{end_day}" if start_day else key
@@ -0,0 +1,50 @@
+"""
+Orders (read-only model, asyncio)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+from async_db import get_async_redis_binary_conn, get_async_redis_conn, get_async_session
+from orders.queries import read_order
+from orders.queries.read_order import apply_order_replies, apply_order_rows, get_report_key, orders_statement, queue_order_reads
+
+async def get_order_by_id(order_id):
+    """Get order by ID from Redis"""
+    return (await get_orders_by_ids([order_id])).get(order_id, {})
+
+async def get_orders_by_ids(order_ids):
+    """Get several orders from Redis with one pipelined HGETALL, falling back to MySQL for the ones Redis lacks"""
+    r = get_async_redis_conn()
+    pipeline = r.pipeline(transaction=False)
+    queue_order_reads(pipeline, order_ids)
+    orders = {}
+    not_in_redis = apply_order_replies(orders, order_ids, await pipeline.execute())
+    if not_in_redis:
+        async with get_async_session() as session:
+            rows = (await session.execute(orders_statement(not_in_redis))).all()
+        pipeline = r.pipeline(transaction=False)
+        orders.update(apply_order_rows(pipeline, not_in_redis, rows))
+        await pipeline.execute()
+    return orders
+
+async def get_report_etag(report, start_day=None, end_day=None):
+    """Get the ETag of a cached report if it is still fresh, None otherwise"""
+    key = get_report_key(report, start_day, end_day)
+    pipeline = get_async_redis_conn().pipeline(transaction=False)
+    pipeline.get(f"{key}:etag")
+    pipeline.exists(f"{key}:fresh")
+    etag, fresh = await pipeline.execute()
+    return etag if fresh else None
+
+async def get_serialized_report(report, start_day=None, end_day=None):
+    """Get a report as cached (JSON bytes) with its ETag"""
+    key = get_report_key(report, start_day, end_day)
+    pipeline = get_async_redis_binary_conn().pipeline(transaction=False)
+    pipeline.get(key)
+    pipeline.get(f"{key}:etag")
+    pipeline.exists(f"{key}:fresh")
+    cached, etag, fresh = await pipeline.execute()
+    if cached is not None and fresh:
+        return cached, etag.decode('utf-8') if etag is not None else None
+    # Valeur périmée ou absente: la reconstruction (verrous, coalescence) reste celle du cache synchrone, dans un thread
+    return await asyncio.to_thread(read_order.get_serialized_report, report, start_day, end_day)
@@ -4,19 +4,66 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
-from db import get_sqlalchemy_session
+import config
+from cache import LRUCache
+from db import get_scoped_session
+from sqlalchemy import select
 from orders.models.user import User
 
+# optimization: les utilisateurs changent rarement, on les garde en mémoire (invalidés par pub/sub à chaque écriture)
+user_cache = LRUCache('users', config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
+
 def get_user_by_id(user_id):
     """Get user by ID """
-    session = get_sqlalchemy_session()
+    user = user_cache.get(user_id)
+    if user is not None:
+        return dict(user)
+
+    session = get_scoped_session()
     result = session.query(User).filter_by(id=user_id).all()
 
     if len(result):
-        return {
-            'id': result[0].id,
-            'name': result[0].name,
-            'email': result[0].email
-        }
+        user = _to_dict(result[0])
+        user_cache.set(user_id, user)
+        return dict(user)
     else:
-        return {}
\ No newline at end of file
+        return {}
+
+def get_users_by_ids(user_ids):
+    """Get several users by ID, as a dict keyed by ID (unknown IDs are left out)"""
+    users, missing = read_users_from_memory(user_ids)
+    if missing:
+        session = get_scoped_session()
+        apply_user_rows(users, session.execute(users_statement(missing)).scalars().all())
+    return users
+
+# Étapes de get_users_by_ids, partagées avec la version asynchrone (read_user_async.py)
+def read_users_from_memory(user_ids):
+    """Returns the users found in the in-process cache and the IDs left to read"""
+    users = {}
+    missing = []
+    for user_id in set(user_ids):
+        user = user_cache.get(user_id)
+        if user is not None:
+            users[user_id] = dict(user)
+        else:
+            missing.append(user_id)
+    return users, missing
+
+def users_statement(user_ids):
+    """SELECT of several users by ID"""
+    return select(User).where(User.id.in_(user_ids))
+
+def apply_user_rows(users, rows):
+    """Add the users read from MySQL to users and to the in-process cache"""
+    for row in rows:
+        user = _to_dict(row)
+        user_cache.set(row.id, user)
+        users[row.id] = dict(user)
+
+def _to_dict(user):
+    return {
+        'id': user.id,
+        'name': user.name,
+        'email': user.email
+    }
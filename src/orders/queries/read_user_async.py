@@ -0,0 +1,20 @@
+"""
+User (read-only model, asyncio)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+
+from async_db import get_async_session
+from orders.queries.read_user import apply_user_rows, read_users_from_memory, users_statement
+
+async def get_user_by_id(user_id):
+    """Get user by ID """
+    return dict((await get_users_by_ids([user_id])).get(user_id, {}))
+
+async def get_users_by_ids(user_ids):
+    """Get several users by ID (memory, then MySQL), as a dict keyed by ID"""
+    users, missing = read_users_from_memory(user_ids)
+    if missing:
+        async with get_async_session() as session:
+            apply_user_rows(users, (await session.execute(users_statement(missing))).scalars().all())
+    return users
@@ -0,0 +1,70 @@
+"""
+JSON serialization (orjson when available, standard library otherwise)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import json
+import config
+from datetime import date
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson est optionnel: on se rabat sur la bibliothèque standard
+    orjson = None
+
+if config.JSON_SERIALIZER == 'json':
+    orjson = None
+
+# optimization: orjson sérialise plusieurs fois plus vite que json et produit directement des octets UTF-8
+# https://github.com/ijl/orjson
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+
+    def dumps(value):
+        """Serialize value to JSON bytes"""
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+    def loads(data):
+        """Deserialize JSON (bytes or str)"""
+        return orjson.loads(data)
+else:
+    def dumps(value):
+        """Serialize value to JSON bytes"""
+        return json.dumps(value, default=_default, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    def loads(data):
+        """Deserialize JSON (bytes or str)"""
+        return json.loads(data)
+
+def dumps_str(value):
+    """Serialize value to a JSON string (for text columns and Redis hash fields)"""
+    return dumps(value).decode('utf-8')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """ Flask JSON provider backed by serialization.dumps/loads. Responses are built from the bytes directly """
+
+    def dumps(self, obj, **kwargs):
+        # Les options de json (indentation...) ne s'appliquent qu'au repli sur la bibliothèque standard
+        if kwargs.get('indent'):
+            return super().dumps(obj, **kwargs)
+        return dumps_str(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(dumps(obj) + b"\n", mimetype=self.mimetype)
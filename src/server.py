@@ -0,0 +1,93 @@
+"""
+Production server (gunicorn)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import fcntl
+import os
+import shutil
+import threading
+import config
+
+# prometheus_client lit cette variable à l'import: elle doit être définie avant de charger l'application
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', config.PROMETHEUS_MULTIPROC_DIR)
+
+from gunicorn.app.base import BaseApplication
+from logger import Logger
+
+logger = Logger.get_instance("server")
+
+class StoreManagerServer(BaseApplication):
+    """ Gunicorn application serving store_manager with several processes, each with several threads.
+    The app is imported once in the master (preload) then forked into the workers """
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        if config.SERVER_MODE == 'asgi':
+            # Lectures asynchrones (async_app.py), écritures dans le pool de threads de l'application Flask
+            from async_app import application
+            return application
+        from store_manager import app
+        return app
+
+def post_worker_init(worker):
+    """ Start the per-process workers, and compete for the per-host ones """
+    from store_manager import start_background_workers
+    start_background_workers(per_host=False, per_process=True)
+    threading.Thread(target=_run_host_workers_when_elected, name="host-election", daemon=True).start()
+
+def _run_host_workers_when_elected():
+    # Un seul worker par hôte tient le verrou (libéré par le noyau à la mort du processus, puis repris par un autre)
+    from store_manager import start_background_workers
+    lock_file = open(config.SERVER_LOCK_FILE, 'w')
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            threading.Event().wait(config.SERVER_ELECTION_INTERVAL)
+            continue
+        logger.debug(f"Le processus {os.getpid()} exécute les tâches de fond de l'hôte")
+        start_background_workers(per_host=True, per_process=False)
+        return  # le fichier reste ouvert (et verrouillé) jusqu'à la fin du processus
+
+def worker_exit(server, worker):
+    """ Stop the background workers of a worker once its in-flight requests are done """
+    from store_manager import stop_background_workers
+    stop_background_workers()
+
+def child_exit(server, worker):
+    """ Drop the metrics of a dead worker from the live gauges """
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def main():
+    """ Run the production server """
+    # Les fichiers de métriques d'une exécution précédente fausseraient les compteurs
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    StoreManagerServer({
+        'bind': config.SERVER_BIND,
+        'workers': config.SERVER_WORKERS,
+        'threads': config.SERVER_THREADS,
+        'worker_class': 'uvicorn.workers.UvicornWorker' if config.SERVER_MODE == 'asgi' else 'gthread',
+        'preload_app': True,
+        'timeout': config.SERVER_TIMEOUT,
+        # SIGTERM: les workers finissent leurs requêtes en cours pendant au plus graceful_timeout secondes
+        'graceful_timeout': config.SERVER_GRACEFUL_TIMEOUT,
+        'keepalive': config.SERVER_KEEPALIVE,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+        'child_exit': child_exit,
+    }).run()
+
+if __name__ == '__main__':
+    main()
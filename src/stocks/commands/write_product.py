@@ -5,7 +5,12 @@ Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
 from stocks.models.product import Product
-from db import get_sqlalchemy_session
+from db import get_redis_conn, get_sqlalchemy_session
+from cache import missing_key, publish_invalidation
+
+def product_key(product_id):
+    """ Redis hash of a product (name, sku, price), as loaded by the data generator """
+    return f"product:{product_id}"
 
 def add_product(name: str, sku: str, price: float):
     """Insert product with items in MySQL"""
@@ -19,6 +24,9 @@ def add_product(name: str, sku: str, price: float):
         session.add(new_product)
         session.flush() 
         session.commit()
+        # L'identifiant a pu être réutilisé (base réinitialisée) ou mémorisé comme inexistant: on retire toute entrée en cache
+        get_redis_conn().delete(product_key(new_product.id), missing_key('product', new_product.id), missing_key('stock', new_product.id))
+        publish_invalidation('products', new_product.id)
         return new_product.id
     except Exception as e:
         session.rollback()
@@ -35,6 +43,8 @@ def delete_product(product_id: int):
         if product:
             session.delete(product)
             session.commit()
+            get_redis_conn().delete(product_key(product_id))
+            publish_invalidation('products', product_id)
             return 1  
         else:
             return 0  
@@ -3,15 +3,93 @@ Product stocks (write-only model)
 SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
+import time
+import config
 from logger import Logger
+from prometheus_client import Counter
 from sqlalchemy import text
 from stocks.models.product import Product
 from stocks.models.stock import Stock
 from db import get_redis_conn, get_sqlalchemy_session
+from cache import missing_key
+from orders.commands.write_outbox import STOCK_CHANGED, add_outbox_event, notify_outbox_relay
+from tracing import span, traced
 
 # Si vous souhaitez en savoir plus sur le processus de logging, rendez-vous dans src/logger.py
 logger = Logger.get_instance("store_manager")
 
+# optimization: vérification et mise à jour du stock de toutes les lignes d'une commande en un seul appel atomique
+# KEYS: marqueur de synchronisation, puis stock:{product_id} de chaque article
+# ARGV: opération (+/-), refus de survente (1/0), puis pour chaque article: quantité, nom, SKU, prix unitaire
+# Retour: {-1} si Redis n'est pas encore synchronisé avec MySQL,
+#         sinon {1 si appliqué ou 0, quantité de chaque article (nouvelle si appliqué, actuelle sinon)}
+STOCK_UPDATE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {-1}
+end
+local operation = ARGV[1]
+local enforce = ARGV[2] == '1'
+local result = {1}
+for i = 2, #KEYS do
+    local current = tonumber(redis.call('HGET', KEYS[i], 'quantity')) or 0
+    local quantity = tonumber(ARGV[i * 4 - 5])
+    result[i] = current
+    if operation == '-' and enforce and current < quantity then
+        result[1] = 0
+    end
+end
+if result[1] == 0 then
+    return result
+end
+for i = 2, #KEYS do
+    local quantity = tonumber(ARGV[i * 4 - 5])
+    if operation == '-' then
+        quantity = -quantity
+    end
+    result[i] = redis.call('HINCRBY', KEYS[i], 'quantity', quantity)
+    if ARGV[i * 4 - 4] ~= '' then
+        redis.call('HSET', KEYS[i], 'product_name', ARGV[i * 4 - 4], 'product_sku', ARGV[i * 4 - 3], 'product_unit_price', ARGV[i * 4 - 2])
+    end
+end
+return result
+"""
+# register_script utilise EVALSHA et ne charge le script (SCRIPT LOAD) que si Redis ne le connaît pas encore
+stock_update_script = get_redis_conn().register_script(STOCK_UPDATE_LUA)
+
+# Marqueur écrit par populate_redis_from_mysql: sa présence (vérifiée en O(1)) indique que Redis contient le stock
+STOCK_READY_KEY = "stocks:synced_at"
+counter_stock_repopulations = Counter('stock_redis_repopulations', 'Times the Redis stock was repopulated from MySQL')
+
+# Aperçu du stock: numéro de version (incrémenté à chaque changement validé) et produits modifiés (score = version)
+STOCK_OVERVIEW_VERSION_KEY = "stocks:overview:version"
+STOCK_OVERVIEW_CHANGES_KEY = "stocks:overview:changes"
+
+def record_stock_changes(session, product_ids):
+    """ Announce the products whose stock changes, through the outbox (in the caller's transaction).
+    The relay applies it to Redis after the commit, outside of the request """
+    add_outbox_event(session, STOCK_CHANGED, {'product_ids': sorted(product_ids)})
+
+# Incrémente la version et journalise les produits modifiés de façon atomique (un lecteur ne voit jamais l'un sans l'autre)
+# Si Redis a été vidé, la version repart d'une valeur (horodatage en ms) plus grande que toutes les précédentes
+MARK_STOCK_CHANGED_LUA = """
+redis.call('SET', KEYS[1], ARGV[1], 'NX')
+local version = redis.call('INCR', KEYS[1])
+for i = 3, #ARGV do
+    redis.call('ZADD', KEYS[2], version, ARGV[i])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', version - tonumber(ARGV[2]))
+return version
+"""
+mark_stock_changed_script = get_redis_conn().register_script(MARK_STOCK_CHANGED_LUA)
+
+def mark_stock_changed(pipeline, product_ids):
+    """ Queue the stock overview version bump and the change log entries on a pipeline, so snapshots can patch themselves """
+    mark_stock_changed_script(
+        keys=[STOCK_OVERVIEW_VERSION_KEY, STOCK_OVERVIEW_CHANGES_KEY],
+        args=[int(time.time() * 1000), config.STOCK_OVERVIEW_CHANGE_LOG_SIZE, *product_ids],
+        client=pipeline
+    )
+
 def set_stock_for_product(product_id, quantity):
     """Set stock quantity for product in MySQL"""
     session = get_sqlalchemy_session()
@@ -30,10 +108,15 @@ def set_stock_for_product(product_id, quantity):
             session.add(new_stock)
             response_message = f"rows added, product {new_stock.product_id}"
             session.flush() 
-            session.commit()
+        record_stock_changes(session, [product_id])
+        session.commit()
+        notify_outbox_relay()
   
         r = get_redis_conn()
-        r.hset(f"stock:{product_id}", "quantity", quantity)
+        pipeline = r.pipeline(transaction=True)
+        pipeline.hset(f"stock:{product_id}", "quantity", quantity)
+        pipeline.delete(missing_key('stock', product_id))
+        pipeline.execute()
         return response_message
     except Exception as e:
         session.rollback()
@@ -41,104 +124,155 @@ def set_stock_for_product(product_id, quantity):
     finally:
         session.close()
     
+def aggregate_quantities(order_items):
+    """ Sum the quantities of order items per product (items can be ORM objects or dicts) """
+    quantities = {}
+    if not order_items:
+        return quantities
+    as_objects = hasattr(order_items[0], 'product_id')
+    for item in order_items:
+        if as_objects:
+            pid = item.product_id
+            qty = item.quantity
+        else:
+            pid = item['product_id']
+            qty = item['quantity']
+        quantities[pid] = quantities.get(pid, 0) + qty
+    return quantities
+
 def update_stock_mysql(session, order_items, operation):
-    """ Update stock quantities in MySQL according to a given operation (+/-) """
+    """ Update stock quantities in MySQL according to a given operation (+/-), with a single statement.
+    Returns the IDs of the products whose stock is too low. The session is left as is (the other rows are already
+    updated): the caller decides whether to roll it back """
+    quantities = aggregate_quantities(order_items)
+    sign = -1 if operation == '-' else 1
+    deltas = {pid: sign * qty for pid, qty in quantities.items() if qty}
+    matched = apply_stock_deltas(session, deltas, prevent_negative=(operation == '-'))
+    if operation == '+' or matched == len(deltas):
+        return []
+
+    # Le garde-fou a refusé au moins un article. Le stock validé est relu dans une autre session: elle ne voit pas
+    # les lignes déjà modifiées par la transaction de l'appelant, qui n'est pas annulée ici
+    check_session = get_sqlalchemy_session()
     try:
-        for item in order_items:
-            if hasattr(order_items[0], 'product_id'):
-                pid = item.product_id
-                qty = item.quantity
-            else:
-                pid = item['product_id']
-                qty = item['quantity']
-            session.execute(
-                text(f"""
-                    UPDATE stocks 
-                    SET quantity = quantity {operation} :qty 
-                    WHERE product_id = :pid
-                """),
-                {"pid": pid, "qty": qty}
-            )
-    except Exception as e:
-        raise e
+        stock_levels = get_stock_levels(check_session, quantities.keys())
+    finally:
+        check_session.close()
+    return [pid for pid, qty in quantities.items() if stock_levels.get(pid, 0) < qty]
     
+def get_stock_levels(session, product_ids, for_update=False):
+    """ Read the MySQL stock of several products with one query, optionally locking the rows (SELECT ... FOR UPDATE) """
+    if not product_ids:
+        return {}
+    params = {f"pid{i}": pid for i, pid in enumerate(sorted(set(product_ids)))}
+    placeholders = ", ".join(f":{name}" for name in params)
+    lock = " FOR UPDATE" if for_update else ""
+    rows = session.execute(
+        text(f"SELECT product_id, quantity FROM stocks WHERE product_id IN ({placeholders}){lock}"),
+        params
+    ).fetchall()
+    return {product_id: quantity for product_id, quantity in rows}
+
+def apply_stock_deltas(session, deltas, prevent_negative=False):
+    """ Apply per-product stock deltas (+/-) in MySQL with a single set-based UPDATE.
+    Returns the number of stock rows matched; with prevent_negative, rows that would go below zero are left untouched """
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    params = {}
+    rows = []
+    for i, (pid, delta) in enumerate(sorted(deltas.items())):
+        params[f"pid{i}"] = pid
+        params[f"delta{i}"] = delta
+        rows.append(f"ROW(:pid{i}, :delta{i})")
+    guard = "WHERE s.quantity + d.delta >= 0" if prevent_negative else ""
+    record_stock_changes(session, deltas.keys())
+    result = session.execute(
+        text(f"""
+            UPDATE stocks s
+            JOIN (VALUES {", ".join(rows)}) AS d (product_id, delta) ON s.product_id = d.product_id
+            SET s.quantity = s.quantity + d.delta
+            {guard}
+        """),
+        params
+    )
+    return result.rowcount
+
 def check_out_items_from_stock(session, order_items):
-    """ Decrease stock quantities in Redis """
-    update_stock_mysql(session, order_items, "-")
+    """ Decrease stock quantities in MySQL, refusing to go below zero """
+    short = update_stock_mysql(session, order_items, "-")
+    if short:
+        raise ValueError(f"Insufficient stock for product IDs {short}")
     
 def check_in_items_to_stock(session, order_items):
-    """ Increase stock quantities in Redis """
+    """ Increase stock quantities in MySQL """
     update_stock_mysql(session, order_items, "+")
 
-def update_stock_redis(order_items, operation):
-    """ Update stock quantities in Redis """
+@traced("update_stock_redis")
+def update_stock_redis(order_items, operation, enforce=None):
+    """ Update stock quantities in Redis atomically, refusing oversell on check-out """
     if not order_items:
         return
+    if enforce is None:
+        enforce = operation == '-'
     r = get_redis_conn()
-    product_ids = []
-    stock_keys = list(r.scan_iter("stock:*"))
-    if stock_keys:
-        pipeline = r.pipeline()
-        for order_item in order_items:
-            if hasattr(order_item, 'product_id'):
-                product_ids.append(order_item.product_id)
-            else:
-                product_ids.append(order_item['product_id'])
-            
-        session = get_sqlalchemy_session()
-        products_query = session.query(
-                Product.id,
-                Product.name,
-                Product.sku,
-                Product.price
-            ).filter(Product.id.in_(product_ids))\
-            .all()
-        
-        for order_item in order_items:
-            if hasattr(order_item, 'product_id'):
-                product_id = order_item.product_id
-                quantity = order_item.quantity
-            else:
-                product_id = order_item['product_id']
-                quantity = order_item['quantity']
-
-            current_stock = r.hget(f"stock:{product_id}", "quantity")
-            current_stock = int(current_stock) if current_stock else 0
-            
-            if operation == '+':
-                new_quantity = current_stock + quantity
-            else:  
-                new_quantity = current_stock - quantity
-
-            order_item_product = {}
-            for product in products_query:
-                if product[0] == product_id:
-                    order_item_product['name'] = product[1] 
-                    order_item_product['sku'] = product[2] 
-                    order_item_product['unit_price'] = product[3] 
-
-            pipeline.hset(f"stock:{product_id}", mapping={ 
-                "product_name": order_item_product['name'], 
-                "product_sku": order_item_product['sku'], 
-                "product_unit_price": order_item_product['unit_price'], 
-                "quantity": new_quantity 
-            })
-        
-        pipeline.execute()
-    
-    else:
-        populate_redis_from_mysql(r)
+
+    # Regrouper les lignes par article (une même commande peut contenir plusieurs lignes du même article)
+    quantities = aggregate_quantities(order_items)
+    product_ids = list(quantities.keys())
+
+    session = get_sqlalchemy_session()
+    try:
+        with span("update_stock_redis.product_query", products=len(product_ids)):
+            products_query = session.query(
+                    Product.id,
+                    Product.name,
+                    Product.sku,
+                    Product.price
+                ).filter(Product.id.in_(product_ids))\
+                .all()
+    finally:
+        session.close()
+    products = {product[0]: product for product in products_query}
+
+    keys = [STOCK_READY_KEY]
+    args = [operation, 1 if enforce else 0]
+    for product_id in product_ids:
+        product = products.get(product_id)
+        keys.append(f"stock:{product_id}")
+        args.extend([
+            quantities[product_id],
+            product[1] if product else '',
+            product[2] if product else '',
+            product[3] if product else ''
+        ])
+
+    # Un seul aller-retour: le script vérifie et applique toutes les lignes de la commande de façon atomique
+    with span("update_stock_redis.script", operation=operation):
+        result = stock_update_script(keys=keys, args=args, client=r)
+    if result[0] == -1:
+        # Redis a été vidé (ou n'a jamais été synchronisé): on recopie MySQL puis on réessaie une seule fois
+        with span("update_stock_redis.populate"):
+            populate_redis_from_mysql(r)
+        result = stock_update_script(keys=keys, args=args, client=r)
+    stock_levels = {product_id: int(level) for product_id, level in zip(product_ids, result[1:])}
+    if not result[0]:
+        short = [pid for pid in product_ids if stock_levels[pid] < quantities[pid]]
+        raise ValueError(f"Insufficient stock for product IDs {short}")
+    return stock_levels
 
 def populate_redis_from_mysql(redis_conn):
     """ Helper function to populate Redis from MySQL stocks table """
     session = get_sqlalchemy_session()
     try:
+        counter_stock_repopulations.inc()
         stocks = session.execute(
             text("SELECT product_id, quantity FROM stocks")
         ).fetchall()
 
         if not len(stocks):
             logger.debug("Il n'est pas nécessaire de synchronisér le stock MySQL avec Redis")
+            redis_conn.set(STOCK_READY_KEY, time.time())
             return
         
         pipeline = redis_conn.pipeline()
@@ -148,6 +282,7 @@ def populate_redis_from_mysql(redis_conn):
                 f"stock:{product_id}", 
                 mapping={ "quantity": quantity }
             )
+        pipeline.set(STOCK_READY_KEY, time.time())
         
         pipeline.execute()
         logger.debug(f"{len(stocks)} enregistrements de stock ont été synchronisés avec Redis")
@@ -156,4 +291,15 @@ def populate_redis_from_mysql(redis_conn):
         logger.error(f"Erreur de synchronisation: {e}")
         raise e
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+def ensure_redis_stock_ready(redis_conn):
+    """ At startup, make sure Redis holds the stock (the only place where the stock:* keyspace is scanned) """
+    if redis_conn.exists(STOCK_READY_KEY):
+        return
+    # Les données chargées par redis_entrypoint.sh n'ont pas de marqueur: une seule clé stock:* suffit pour conclure
+    if next(redis_conn.scan_iter("stock:*", count=1000), None):
+        redis_conn.set(STOCK_READY_KEY, time.time())
+        logger.debug("Stock déjà présent dans Redis, marqueur de synchronisation ajouté")
+    else:
+        populate_redis_from_mysql(redis_conn)
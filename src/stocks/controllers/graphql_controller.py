@@ -0,0 +1,168 @@
+"""
+GraphQL controller
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import hashlib
+import config
+from flask import jsonify
+from graphql import GraphQLError, execute_sync, parse, validate
+from cache import LRUCache
+from db import get_redis_conn
+from stocks.schemas.cost import check_query_cost, coerce_variables
+from stocks.schemas.loaders import ProductLoader, collect_product_ids
+from stocks.schemas.schema import schema
+from tracing import span, tracing_enabled
+
+# Requêtes persistées: une clé par sha256 du texte, partagée par tous les réplicas. Le TTL (prolongé à chaque
+# utilisation) et la taille maximale bornent la mémoire que des clients peuvent occuper en enregistrant des requêtes
+PERSISTED_QUERY_KEY_PREFIX = "graphql:persisted_query:"
+
+# optimization: les fournisseurs envoient toujours les mêmes requêtes, on garde le document analysé et validé en mémoire
+# https://graphql-core-3.readthedocs.io/en/latest/usage/parser.html
+document_cache = LRUCache('graphql_documents', config.GRAPHQL_DOCUMENT_CACHE_SIZE)
+persisted_query_cache = LRUCache('graphql_persisted_queries', config.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+def execute_graphql(request):
+    """Run a GraphQL query sent as text, or as the sha256 hash of a persisted query"""
+    data = request.get_json(silent=True) or {}
+    try:
+        query = resolve_query_text(data)
+    except GraphQLError as e:
+        return jsonify({'data': None, 'errors': [str(e)]}), 200
+    except ValueError as e:
+        return jsonify({'data': None, 'errors': [str(e)]}), 400
+    document, variables, errors = prepare_query(query, data)
+    if errors:
+        return jsonify({'data': None, 'errors': errors}), 200
+
+    # optimization: tous les produits demandés par la requête sont lus dans Redis en un seul aller-retour
+    loader = ProductLoader()
+    with span("graphql.load_products"):
+        loader.prime(collect_product_ids(document, variables))
+    return jsonify(run_query(document, variables, data, loader)), 200
+
+async def execute_graphql_async(data):
+    """Same as execute_graphql for the asyncio read path: returns the response payload and status"""
+    # Import local: l'application Flask (synchrone) ne dépend pas des pilotes asynchrones
+    from stocks.queries.read_product_async import load_products_async
+    try:
+        # Une requête persistée peut demander une lecture ou une écriture Redis (synchrone): elle se fait dans un thread
+        if data.get('id') or data.get('extensions'):
+            query = await asyncio.to_thread(resolve_query_text, data)
+        else:
+            query = resolve_query_text(data)
+    except GraphQLError as e:
+        return {'data': None, 'errors': [str(e)]}, 200
+    except ValueError as e:
+        return {'data': None, 'errors': [str(e)]}, 400
+    document, variables, errors = prepare_query(query, data)
+    if errors:
+        return {'data': None, 'errors': errors}, 200
+
+    # Les produits sont lus avant l'exécution: les résolveurs (synchrones) ne font alors plus aucune entrée/sortie
+    loader = ProductLoader()
+    with span("graphql.load_products"):
+        loader.fill(await load_products_async(collect_product_ids(document, variables)))
+    return run_query(document, variables, data, loader), 200
+
+def prepare_query(query, data):
+    """Parse, validate and cost a query. Returns the document, the coerced variables and the error messages"""
+    with span("graphql.prepare"):
+        return _prepare_query(query, data)
+
+def _prepare_query(query, data):
+    try:
+        document, errors = get_document(query)
+    except GraphQLError as e:
+        return None, None, [str(e)]
+    if errors:
+        return None, None, [str(e) for e in errors]
+    variables = data.get('variables') if isinstance(data.get('variables'), dict) else None
+    # Les valeurs par défaut des variables comptent dans le coût: ($ids: [ID!]! = [...]) n'est pas une liste d'un élément
+    coerced_variables, errors = coerce_variables(schema.graphql_schema, document, variables, data.get('operationName'))
+    if errors:
+        return None, None, errors
+    try:
+        # Le coût est calculé avant l'exécution: une requête trop chère ne touche jamais Redis
+        check_query_cost(document, coerced_variables, data.get('operationName'))
+    except GraphQLError as e:
+        return None, None, [str(e)]
+    # Les identifiants sont collectés (et la requête exécutée) avec les valeurs par défaut déjà appliquées
+    return document, coerced_variables, None
+
+def run_query(document, variables, data, loader):
+    """Execute a prepared query; returns the response payload"""
+    with span("graphql.execute"):
+        result = execute_sync(
+            schema.graphql_schema,
+            document,
+            context_value={'product_loader': loader},
+            variable_values=variables,
+            operation_name=data.get('operationName'),
+            # Le middleware n'est ajouté que si les traces sont actives: sinon chaque champ paierait un appel de plus
+            middleware=[trace_root_fields] if tracing_enabled() else None
+        )
+    return {
+        'data': result.data,
+        'errors': [str(e) for e in result.errors] if result.errors else None
+    }
+
+def trace_root_fields(next_resolver, root, info, **args):
+    """GraphQL middleware recording one span per root field resolver (the nested fields only read attributes)"""
+    if info.path.prev is not None:
+        return next_resolver(root, info, **args)
+    with span(f"graphql.resolve.{info.field_name}"):
+        return next_resolver(root, info, **args)
+
+def resolve_query_text(data):
+    """Get the query text of a request, registering it if it comes with its persisted query hash"""
+    query = data.get('query')
+    query_hash = data.get('id') or ((data.get('extensions') or {}).get('persistedQuery') or {}).get('sha256Hash')
+    if query is not None and not isinstance(query, str):
+        raise ValueError("query must be a string")
+    if query_hash is None:
+        if not query:
+            raise ValueError("query is required")
+        return query
+    if not isinstance(query_hash, str):
+        raise ValueError("persisted query hash must be a string")
+
+    if query:
+        # Enregistrement (protocole Apollo): le hash doit correspondre au texte pour ne pas empoisonner le registre
+        if hashlib.sha256(query.encode('utf-8')).hexdigest() != query_hash:
+            raise ValueError("provided sha256Hash does not match query")
+        if len(query) > config.GRAPHQL_PERSISTED_QUERY_MAX_LENGTH:
+            raise ValueError(f"query is longer than {config.GRAPHQL_PERSISTED_QUERY_MAX_LENGTH} characters and cannot be persisted")
+        # Une requête invalide n'est pas enregistrée: l'erreur sera renvoyée par prepare_query
+        if persisted_query_cache.get(query_hash) is None and _is_valid_query(query):
+            get_redis_conn().set(PERSISTED_QUERY_KEY_PREFIX + query_hash, query, ex=config.GRAPHQL_PERSISTED_QUERY_TTL, nx=True)
+            persisted_query_cache.set(query_hash, query)
+        return query
+
+    query = persisted_query_cache.get(query_hash)
+    if query is None:
+        query = get_redis_conn().getex(PERSISTED_QUERY_KEY_PREFIX + query_hash, ex=config.GRAPHQL_PERSISTED_QUERY_TTL)
+        if query is None:
+            # Le client renvoie alors la requête complète avec son hash
+            raise GraphQLError("PersistedQueryNotFound")
+        persisted_query_cache.set(query_hash, query)
+    return query
+
+def _is_valid_query(query):
+    try:
+        _, errors = get_document(query)
+    except GraphQLError:
+        return False
+    return not errors
+
+def get_document(query):
+    """Get the parsed document of a query and its validation errors, from the cache when possible"""
+    cached = document_cache.get(query)
+    if cached is None:
+        # Une erreur de syntaxe (GraphQLError) n'est pas mise en cache
+        document = parse(query)
+        cached = (document, validate(schema.graphql_schema, document))
+        document_cache.set(query, cached)
+    return cached
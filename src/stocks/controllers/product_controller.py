@@ -6,7 +6,8 @@ Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 
 from flask import jsonify
 from stocks.commands.write_product import add_product, delete_product
-from stocks.queries.read_product import get_product_by_id
+from stocks.queries.read_product import get_product_by_id, get_products_by_ids
+from bulk import bulk_result, parse_ids
 
 def create_product(request):
     """Create product, use WriteProduct model"""
@@ -36,4 +37,15 @@ def get_product(product_id):
         product = get_product_by_id(product_id)
         return jsonify(product), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+def get_products(request):
+    """Get several products at once (?ids=1,2,3), in request order, with the list of missing IDs"""
+    try:
+        ids = parse_ids(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(bulk_result(ids, get_products_by_ids(ids))), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
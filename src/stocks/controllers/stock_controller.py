@@ -4,10 +4,16 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
+import csv
+import io
+import config
 from db import get_redis_conn
-from flask import jsonify
-from stocks.queries.read_stock import get_stock_by_id, get_stock_for_all_products
-from stocks.commands.write_stock import populate_redis_from_mysql, set_stock_for_product
+from flask import Response, jsonify, stream_with_context
+from stocks.queries.read_stock import get_stock_by_id, get_stocks_by_ids, get_stock_page, iter_stock_overview, stock_overview_snapshot
+from http_cache import cached_response
+from bulk import bulk_result, parse_ids
+from serialization import dumps
+from stocks.commands.write_stock import ensure_redis_stock_ready, set_stock_for_product
 
 def set_stock(request):
     """Set stock quantities of a product"""
@@ -28,10 +34,72 @@ def get_stock(product_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
-def get_stock_overview():
-    """Get stock for all products"""
-    return get_stock_for_all_products()
+def get_stock_overview(request):
+    """Get stock for all products: whole list, one page (?limit=&after_product_id=) or streamed (?format=ndjson|csv)"""
+    try:
+        output_format, after_product_id, limit = parse_overview_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if output_format in ('ndjson', 'csv'):
+            chunks = iter_stock_overview(after_product_id, limit)
+            writer = write_ndjson if output_format == 'ndjson' else write_csv
+            mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'text/csv'
+            return Response(stream_with_context(writer(chunks)), mimetype=mimetype), 200
+        if limit is not None or after_product_id:
+            rows, next_after = get_stock_page(after_product_id, limit or config.STOCK_OVERVIEW_MAX_PAGE_SIZE)
+            return jsonify({'items': rows, 'next_after_product_id': next_after}), 200
+        # optimization: la liste complète est servie depuis un instantané compressé; un client à jour reçoit 304
+        gzipped_body, etag = stock_overview_snapshot.get()
+        return cached_response(request, None, etag, gzipped_body=gzipped_body)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_overview_params(args):
+    """Read format, after_product_id and limit from the query string"""
+    output_format = args.get('format', 'json')
+    if output_format not in ('json', 'ndjson', 'csv'):
+        raise ValueError("Invalid format. Expected json, ndjson or csv.")
+    after_product_id = args.get('after_product_id', '0')
+    limit = args.get('limit')
+    if not after_product_id.isdigit():
+        raise ValueError("Invalid after_product_id. Expected a product ID.")
+    if limit is not None and (not limit.isdigit() or int(limit) < 1):
+        raise ValueError("Invalid limit. Expected a positive integer.")
+    # Le flux n'a pas de limite de taille; une page JSON en a une
+    if limit is not None and output_format == 'json' and int(limit) > config.STOCK_OVERVIEW_MAX_PAGE_SIZE:
+        raise ValueError(f"Invalid limit. A page holds at most {config.STOCK_OVERVIEW_MAX_PAGE_SIZE} products.")
+    return output_format, int(after_product_id), int(limit) if limit is not None else None
+
+def write_ndjson(chunks):
+    """Serialize chunks of overview rows as newline-delimited JSON, one chunk at a time"""
+    for rows in chunks:
+        yield b''.join(dumps(row) + b'\n' for row in rows)
+
+def write_csv(chunks):
+    """Serialize chunks of overview rows as CSV (header first), one chunk at a time"""
+    header_written = False
+    for rows in chunks:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+        if not header_written:
+            writer.writeheader()
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
 
 def populate_redis_on_startup():
+    """Make sure Redis holds the stock before the first order is written"""
     r = get_redis_conn()
-    populate_redis_from_mysql(r)
\ No newline at end of file
+    ensure_redis_stock_ready(r)
+
+def get_stocks(request):
+    """Get several stocks at once (?ids=1,2,3), in request order, with the list of missing IDs"""
+    try:
+        ids = parse_ids(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(bulk_result(ids, get_stocks_by_ids(ids))), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
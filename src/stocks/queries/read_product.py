@@ -4,22 +4,105 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
-from db import get_sqlalchemy_session
+import config
+from cache import LRUCache, missing_key, read_tier_requests
+from db import get_redis_conn, get_scoped_session
+from sqlalchemy import select
+from stocks.commands.write_product import product_key
 from stocks.models.product import Product
 
+# optimization: les produits changent rarement, on les garde en mémoire (invalidés par pub/sub à chaque écriture)
+product_cache = LRUCache('products', config.PRODUCT_CACHE_SIZE, ttl=config.PRODUCT_CACHE_TTL)
+
 def get_product_by_id(product_id):
     """Get product by ID """
-    session = get_sqlalchemy_session()
-    result = session.query(Product).filter_by(id=product_id).all()
+    return dict(get_products_by_ids([product_id]).get(product_id, {}))
+
+def get_products_by_ids(product_ids):
+    """Get several products by ID, as a dict keyed by ID (unknown IDs are left out).
+    Each product is read from memory, then Redis, then MySQL, the faster tiers being filled on the way back"""
+    products, missing = read_products_from_memory(product_ids)
+    if not missing:
+        return products
+
+    # optimization: un seul aller-retour Redis pour les hashs des produits et leurs marqueurs d'absence
+    r = get_redis_conn()
+    pipeline = r.pipeline(transaction=False)
+    queue_product_reads(pipeline, missing)
+    not_in_redis = apply_product_replies(products, missing, pipeline.execute())
+    if not not_in_redis:
+        return products
+
+    session = get_scoped_session()
+    rows = session.execute(products_statement(not_in_redis)).scalars().all()
+    pipeline = r.pipeline(transaction=False)
+    apply_product_rows(products, pipeline, not_in_redis, rows)
+    pipeline.execute()
+    return products
+
+# Étapes de get_products_by_ids, partagées avec la version asynchrone (read_product_async.py)
+def read_products_from_memory(product_ids):
+    """Returns the products found in the in-process cache and the IDs left to read"""
+    products = {}
+    missing = []
+    for product_id in set(product_ids):
+        product = product_cache.get(product_id)
+        if product is not None:
+            read_tier_requests.labels('product', 'memory').inc()
+            products[product_id] = dict(product)
+        else:
+            missing.append(product_id)
+    return products, missing
+
+def queue_product_reads(pipeline, product_ids):
+    """Queue the reads of the product hashes and of their negative cache markers on a Redis pipeline"""
+    for product_id in product_ids:
+        pipeline.hgetall(product_key(product_id))
+        pipeline.exists(missing_key('product', product_id))
+
+def apply_product_replies(products, product_ids, replies):
+    """Add the products found in Redis to products; returns the IDs Redis knows nothing about"""
+    not_in_redis = []
+    for product_id, product_data, known_missing in zip(product_ids, replies[0::2], replies[1::2]):
+        if product_data:
+            read_tier_requests.labels('product', 'redis').inc()
+            product = {
+                'id': int(product_id),
+                'name': product_data['name'],
+                'sku': product_data['sku'],
+                'price': float(product_data['price'])
+            }
+            product_cache.set(product_id, product)
+            products[product_id] = dict(product)
+        elif known_missing:
+            read_tier_requests.labels('product', 'negative').inc()
+        else:
+            not_in_redis.append(product_id)
+    return not_in_redis
 
-    if len(result):
-        return {
-            'id': result[0].id,
-            'name': result[0].name,
-            'sku': result[0].sku,
-            'price': result[0].price
-        }
-    else:
-        return {}
+def products_statement(product_ids):
+    """SELECT of several products by ID"""
+    return select(Product).where(Product.id.in_(product_ids))
 
+def apply_product_rows(products, pipeline, product_ids, rows):
+    """Add the products read from MySQL to products, and queue their copy (or their absence) in Redis"""
+    for row in rows:
+        read_tier_requests.labels('product', 'mysql').inc()
+        product = _to_dict(row)
+        product_cache.set(row.id, product)
+        products[row.id] = dict(product)
+        pipeline.hset(product_key(row.id), mapping={'name': row.name, 'sku': row.sku, 'price': row.price})
+    # Cache négatif: un identifiant inexistant ne retourne pas à MySQL avant NEGATIVE_CACHE_TTL secondes
+    found = {row.id for row in rows}
+    for product_id in product_ids:
+        if product_id not in found:
+            read_tier_requests.labels('product', 'mysql').inc()
+            pipeline.set(missing_key('product', product_id), 1, ex=config.NEGATIVE_CACHE_TTL)
 
+def _to_dict(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'price': product.price
+    }
@@ -0,0 +1,42 @@
+"""
+Product (read-only model, asyncio)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+
+from async_db import get_async_redis_conn, get_async_session
+from stocks.queries.read_product import apply_product_replies, apply_product_rows, products_statement, queue_product_reads, read_products_from_memory
+
+async def get_product_by_id(product_id):
+    """Get product by ID """
+    return dict((await get_products_by_ids([product_id])).get(product_id, {}))
+
+async def get_products_by_ids(product_ids):
+    """Get several products by ID (memory, then Redis, then MySQL), as a dict keyed by ID"""
+    products, missing = read_products_from_memory(product_ids)
+    if not missing:
+        return products
+
+    r = get_async_redis_conn()
+    pipeline = r.pipeline(transaction=False)
+    queue_product_reads(pipeline, missing)
+    not_in_redis = apply_product_replies(products, missing, await pipeline.execute())
+    if not not_in_redis:
+        return products
+
+    async with get_async_session() as session:
+        rows = (await session.execute(products_statement(not_in_redis))).scalars().all()
+    pipeline = r.pipeline(transaction=False)
+    apply_product_rows(products, pipeline, not_in_redis, rows)
+    await pipeline.execute()
+    return products
+
+async def load_products_async(product_ids):
+    """Fetch the stock hashes of several products (GraphQL loader) with one pipelined HGETALL batch"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    pipeline = get_async_redis_conn().pipeline(transaction=False)
+    for product_id in product_ids:
+        pipeline.hgetall(f"stock:{product_id}")
+    return dict(zip(product_ids, await pipeline.execute()))
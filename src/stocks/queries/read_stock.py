@@ -4,39 +4,204 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
-from db import get_sqlalchemy_session
+import gzip
+import threading
+import time
+import config
+from cache import missing_key, read_tier_requests
+from db import get_redis_conn, get_scoped_session, get_sqlalchemy_session
+from http_cache import make_etag
+from serialization import dumps
+from prometheus_client import Counter, Gauge
+from sqlalchemy import select
+from stocks.commands.write_stock import STOCK_OVERVIEW_CHANGES_KEY, STOCK_OVERVIEW_VERSION_KEY
 from stocks.models.product import Product
 from stocks.models.stock import Stock
 
+stock_overview_snapshot_age = Gauge('stock_overview_snapshot_age_seconds', 'Time since the stock overview snapshot was last rebuilt from scratch', multiprocess_mode='max')
+stock_overview_snapshot_patches = Counter('stock_overview_snapshot_patches', 'Incremental updates of the stock overview snapshot')
+stock_overview_snapshot_rebuilds = Counter('stock_overview_snapshot_rebuilds', 'Full rebuilds of the stock overview snapshot')
+
 def get_stock_by_id(product_id):
     """Get stock by product ID """
-    session = get_sqlalchemy_session()
-    result = session.query(Stock).filter_by(product_id=product_id).all()
-    if len(result):
-        return {
-            'product_id': result[0].product_id,
-            'quantity': result[0].quantity,
-        }
-    else:
-        return {}
-
-def get_stock_for_all_products():
-    """Get stock quantity for all products"""
-    session = get_sqlalchemy_session()
-    results = session.query(
+    return get_stocks_by_ids([product_id]).get(product_id, {})
+
+def get_stocks_by_ids(product_ids):
+    """Get the stock of several products, as a dict keyed by product ID.
+    Redis (the stock of record for orders) is read first; MySQL only serves, and refills, the IDs Redis lacks"""
+    product_ids = list(dict.fromkeys(product_ids))
+    r = get_redis_conn()
+    pipeline = r.pipeline(transaction=False)
+    queue_stock_reads(pipeline, product_ids)
+    stocks = {}
+    not_in_redis = apply_stock_replies(stocks, product_ids, pipeline.execute())
+    if not not_in_redis:
+        return stocks
+
+    session = get_scoped_session()
+    rows = session.execute(stocks_statement(not_in_redis)).all()
+    pipeline = r.pipeline(transaction=False)
+    apply_stock_rows(stocks, pipeline, not_in_redis, rows)
+    pipeline.execute()
+    return stocks
+
+# Étapes de get_stocks_by_ids, partagées avec la version asynchrone (read_stock_async.py)
+def queue_stock_reads(pipeline, product_ids):
+    """Queue the reads of the stock quantities and of their negative cache markers on a Redis pipeline"""
+    for product_id in product_ids:
+        pipeline.hget(f"stock:{product_id}", "quantity")
+        pipeline.exists(missing_key('stock', product_id))
+
+def apply_stock_replies(stocks, product_ids, replies):
+    """Add the stocks found in Redis to stocks; returns the IDs Redis knows nothing about"""
+    not_in_redis = []
+    for product_id, quantity, known_missing in zip(product_ids, replies[0::2], replies[1::2]):
+        if quantity is not None:
+            read_tier_requests.labels('stock', 'redis').inc()
+            stocks[product_id] = {'product_id': int(product_id), 'quantity': int(quantity)}
+        elif known_missing:
+            read_tier_requests.labels('stock', 'negative').inc()
+        else:
+            not_in_redis.append(product_id)
+    return not_in_redis
+
+def stocks_statement(product_ids):
+    """SELECT of the stock of several products"""
+    return select(Stock.product_id, Stock.quantity).where(Stock.product_id.in_(product_ids))
+
+def apply_stock_rows(stocks, pipeline, product_ids, rows):
+    """Add the stocks read from MySQL to stocks, and queue their copy (or their absence) in Redis"""
+    for row in rows:
+        read_tier_requests.labels('stock', 'mysql').inc()
+        stocks[row.product_id] = {'product_id': row.product_id, 'quantity': row.quantity}
+        # HSETNX: ne jamais écraser une quantité écrite entre-temps par une commande
+        pipeline.hsetnx(f"stock:{row.product_id}", "quantity", row.quantity)
+    found = {row.product_id for row in rows}
+    for product_id in product_ids:
+        if product_id not in found:
+            read_tier_requests.labels('stock', 'mysql').inc()
+            pipeline.set(missing_key('stock', product_id), 1, ex=config.NEGATIVE_CACHE_TTL)
+
+def get_stock_page(after_product_id=0, limit=100):
+    """Get one page of the stock overview, ordered by product ID (keyset pagination).
+    Returns the rows and the product ID to pass as after_product_id for the next page (None on the last page)"""
+    session = get_scoped_session()
+    results = _overview_query(session)\
+        .filter(Stock.product_id > after_product_id)\
+        .limit(limit)\
+        .all()
+    next_after = results[-1].product_id if len(results) == limit else None
+    return [_to_overview_row(row) for row in results], next_after
+
+def iter_stock_overview(after_product_id=0, limit=None, chunk_size=None):
+    """Yield the stock overview chunk by chunk, so the whole catalog is never held in memory"""
+    chunk_size = chunk_size or config.STOCK_OVERVIEW_CHUNK_SIZE
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        # Une session courte par bloc: la connexion retourne au pool pendant que le client lit la réponse
+        session = get_sqlalchemy_session()
+        try:
+            results = _overview_query(session)\
+                .filter(Stock.product_id > after_product_id)\
+                .limit(size)\
+                .all()
+        finally:
+            session.close()
+        if not results:
+            return
+        yield [_to_overview_row(row) for row in results]
+        if len(results) < size:
+            return
+        after_product_id = results[-1].product_id
+        if remaining is not None:
+            remaining -= len(results)
+
+def _overview_query(session):
+    return session.query(
         Stock.product_id,
         Stock.quantity,
         Product.name,
         Product.sku,
         Product.price
-    ).join(Product, Product.id == Stock.product_id).all()
-    stock_data = []
-    for row in results:
-        stock_data.append({
-            'Article': row.name,
-            'Numéro SKU': row.sku,
-            'Prix unitaire': float(row.price),
-            'Unités en stock': int(row.quantity),
-        })
-    
-    return stock_data
+    ).join(Product, Product.id == Stock.product_id)\
+     .order_by(Stock.product_id)
+
+def _to_overview_row(row):
+    return {
+        'Article': row.name,
+        'Numéro SKU': row.sku,
+        'Prix unitaire': float(row.price),
+        'Unités en stock': int(row.quantity),
+    }
+
+
+class StockOverviewSnapshot:
+    """ In-process snapshot of the stock overview, kept serialized and gzip-compressed.
+    When the stock version in Redis moves, only the products logged as changed since the snapshot's version
+    are read again from MySQL; the snapshot is rebuilt from scratch if the log does not go back far enough """
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age or config.STOCK_OVERVIEW_MAX_AGE
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._version = None
+        self._built_at = None
+        self._gzipped_body = None
+        self._etag = None
+
+    def get(self):
+        """ Get the compressed overview and its ETag, bringing the snapshot up to date first if the stock changed """
+        version = _to_version(get_redis_conn().get(STOCK_OVERVIEW_VERSION_KEY))
+        if not self._is_current(version):
+            with self._lock:
+                if not self._is_current(version):
+                    self._refresh()
+        stock_overview_snapshot_age.set(time.monotonic() - self._built_at)
+        return self._gzipped_body, self._etag
+
+    def _is_current(self, version):
+        return self._gzipped_body is not None \
+            and self._version == version \
+            and time.monotonic() - self._built_at < self.max_age
+
+    def _refresh(self):
+        r = get_redis_conn()
+        # Version et journal lus ensemble: MySQL contient au moins tous les changements jusqu'à cette version
+        pipeline = r.pipeline(transaction=True)
+        pipeline.get(STOCK_OVERVIEW_VERSION_KEY)
+        if self._version is not None:
+            pipeline.zrangebyscore(STOCK_OVERVIEW_CHANGES_KEY, f"({self._version}", '+inf')
+        replies = pipeline.execute()
+        version = _to_version(replies[0])
+        changed = replies[1] if len(replies) > 1 else []
+
+        session = get_scoped_session()
+        can_patch = self._gzipped_body is not None \
+            and self._version is not None and version is not None \
+            and 0 <= version - self._version < config.STOCK_OVERVIEW_CHANGE_LOG_SIZE \
+            and len(changed) <= config.STOCK_OVERVIEW_MAX_PATCH \
+            and time.monotonic() - self._built_at < self.max_age
+        if can_patch:
+            product_ids = [int(product_id) for product_id in changed]
+            results = _overview_query(session).filter(Stock.product_id.in_(product_ids)).all() if product_ids else []
+            for product_id in product_ids:
+                self._rows.pop(product_id, None)
+            for row in results:
+                self._rows[row.product_id] = dumps(_to_overview_row(row))
+            stock_overview_snapshot_patches.inc()
+        else:
+            self._rows = {row.product_id: dumps(_to_overview_row(row)) for row in _overview_query(session).all()}
+            self._built_at = time.monotonic()
+            stock_overview_snapshot_rebuilds.inc()
+
+        # Chaque ligne est sérialisée une seule fois; seul l'assemblage et la compression sont refaits
+        body = b'[' + b','.join(self._rows[product_id] for product_id in sorted(self._rows)) + b']'
+        self._gzipped_body = gzip.compress(body, compresslevel=6)
+        self._etag = make_etag(body)
+        self._version = version
+
+def _to_version(raw_version):
+    return int(raw_version) if raw_version is not None else None
+
+stock_overview_snapshot = StockOverviewSnapshot()
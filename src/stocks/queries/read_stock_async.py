@@ -0,0 +1,30 @@
+"""
+Product stocks (read-only model, asyncio)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+
+from async_db import get_async_redis_conn, get_async_session
+from stocks.queries.read_stock import apply_stock_replies, apply_stock_rows, queue_stock_reads, stocks_statement
+
+async def get_stock_by_id(product_id):
+    """Get stock by product ID """
+    return (await get_stocks_by_ids([product_id])).get(product_id, {})
+
+async def get_stocks_by_ids(product_ids):
+    """Get the stock of several products (Redis, then MySQL), as a dict keyed by product ID"""
+    product_ids = list(dict.fromkeys(product_ids))
+    r = get_async_redis_conn()
+    pipeline = r.pipeline(transaction=False)
+    queue_stock_reads(pipeline, product_ids)
+    stocks = {}
+    not_in_redis = apply_stock_replies(stocks, product_ids, await pipeline.execute())
+    if not not_in_redis:
+        return stocks
+
+    async with get_async_session() as session:
+        rows = (await session.execute(stocks_statement(not_in_redis))).all()
+    pipeline = r.pipeline(transaction=False)
+    apply_stock_rows(stocks, pipeline, not_in_redis, rows)
+    await pipeline.execute()
+    return stocks
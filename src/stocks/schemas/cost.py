@@ -0,0 +1,121 @@
+"""
+GraphQL query cost analysis
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import config
+from graphql import GraphQLError
+from graphql.execution.values import get_variable_values
+from graphql.language import FieldNode, FragmentDefinitionNode, FragmentSpreadNode, InlineFragmentNode, OperationDefinitionNode
+from graphql.pyutils import Undefined
+from graphql.utilities import value_from_ast_untyped
+from prometheus_client import Histogram
+
+graphql_query_cost = Histogram('graphql_query_cost', 'Static cost of the executed GraphQL queries', buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+
+# Coût d'une résolution de champ (≈ une lecture Redis); les autres champs (scalaires, introspection) ne coûtent rien
+FIELD_COSTS = {
+    'product': 1,
+    'products': 1,
+    'stockLevel': 1,
+    'stockLevels': 1,
+}
+
+# Champs de type liste: le coût (et celui des sous-champs) est multiplié par la taille de la liste d'identifiants
+LIST_SIZE_ARGUMENTS = {
+    'products': 'ids',
+    'stockLevels': 'productIds',
+}
+
+# Taille d'une liste qu'on ne peut pas déterminer avant l'exécution: on suppose le pire
+UNKNOWN_LIST_SIZE = config.GRAPHQL_MAX_COST
+
+class QueryCost:
+    """ Static cost, depth and alias count of a GraphQL operation """
+
+    def __init__(self, cost, depth, aliases):
+        self.cost = cost
+        self.depth = depth
+        self.aliases = aliases
+
+def analyze_query(document, variables=None, operation_name=None):
+    """ Compute the static cost of the operation of a parsed (and validated) document """
+    fragments = {d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)}
+    operation = _select_operation(document, operation_name)
+    if operation is None:
+        return QueryCost(0, 0, 0)
+    aliases = [0]
+    cost, depth = _selection_set_cost(operation.selection_set, fragments, variables, aliases, set())
+    return QueryCost(cost, depth, aliases[0])
+
+def coerce_variables(graphql_schema, document, variables=None, operation_name=None):
+    """ Coerce the variables of the selected operation, defaults included. Returns (variables, error messages) """
+    operation = _select_operation(document, operation_name)
+    if operation is None:
+        # L'exécution signalera l'opération manquante ou ambiguë
+        return variables, None
+    coerced = get_variable_values(graphql_schema, operation.variable_definitions or (), variables or {})
+    if isinstance(coerced, list):
+        return None, [str(e) for e in coerced]
+    return coerced, None
+
+def check_query_cost(document, variables=None, operation_name=None):
+    """ Reject a query that exceeds the cost, depth or alias limits, and record its cost """
+    query_cost = analyze_query(document, variables, operation_name)
+    if query_cost.depth > config.GRAPHQL_MAX_DEPTH:
+        raise GraphQLError(f"Query depth {query_cost.depth} exceeds the maximum depth of {config.GRAPHQL_MAX_DEPTH}")
+    if query_cost.aliases > config.GRAPHQL_MAX_ALIASES:
+        raise GraphQLError(f"Query uses {query_cost.aliases} aliases, more than the maximum of {config.GRAPHQL_MAX_ALIASES}")
+    if query_cost.cost > config.GRAPHQL_MAX_COST:
+        raise GraphQLError(f"Query cost {query_cost.cost} exceeds the maximum cost of {config.GRAPHQL_MAX_COST}")
+    graphql_query_cost.observe(query_cost.cost)
+    return query_cost
+
+def _select_operation(document, operation_name):
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    if operation_name:
+        return next((o for o in operations if o.name and o.name.value == operation_name), None)
+    return operations[0] if len(operations) == 1 else None
+
+def _selection_set_cost(selection_set, fragments, variables, aliases, visited_fragments):
+    """ Returns (cost, depth) of a selection set, fragments being inlined """
+    cost, depth = 0, 0
+    for selection in selection_set.selections if selection_set else ():
+        if isinstance(selection, FieldNode):
+            # L'introspection ne lit rien dans Redis (et sa profondeur dépasserait la limite)
+            if selection.name.value.startswith('__'):
+                continue
+            if selection.alias:
+                aliases[0] += 1
+            child_cost, child_depth = _selection_set_cost(selection.selection_set, fragments, variables, aliases, visited_fragments)
+            multiplier = _list_size(selection, variables)
+            cost += multiplier * (FIELD_COSTS.get(selection.name.value, 0) + child_cost)
+            depth = max(depth, child_depth + 1)
+        elif isinstance(selection, InlineFragmentNode):
+            child_cost, child_depth = _selection_set_cost(selection.selection_set, fragments, variables, aliases, visited_fragments)
+            cost += child_cost
+            depth = max(depth, child_depth)
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            # La validation rejette déjà les cycles de fragments; on se protège quand même
+            if name in visited_fragments or name not in fragments:
+                continue
+            child_cost, child_depth = _selection_set_cost(fragments[name].selection_set, fragments, variables, aliases, visited_fragments | {name})
+            cost += child_cost
+            depth = max(depth, child_depth)
+    return cost, depth
+
+def _list_size(field, variables):
+    argument_name = LIST_SIZE_ARGUMENTS.get(field.name.value)
+    if argument_name is None:
+        return 1
+    for argument in field.arguments or ():
+        if argument.name.value == argument_name:
+            value = value_from_ast_untyped(argument.value, variables)
+            if isinstance(value, (list, tuple)):
+                return len(value)
+            if value is Undefined:
+                return UNKNOWN_LIST_SIZE
+            # Une valeur seule est convertie en liste d'un élément
+            return 1
+    return 1
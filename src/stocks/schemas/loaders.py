@@ -0,0 +1,84 @@
+"""
+GraphQL data loaders
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from graphql.language import Visitor, visit
+from graphql.pyutils import Undefined
+from graphql.utilities import value_from_ast_untyped
+from db import get_redis_conn
+
+# Champs du schéma qui lisent le stock d'un ou plusieurs produits, et l'argument qui porte les identifiants
+PRODUCT_ID_ARGUMENTS = {
+    'product': 'id',
+    'products': 'ids',
+    'stockLevel': 'productId',
+    'stockLevels': 'productIds',
+}
+
+class ProductLoader:
+    """ Per-request loader of the product stock hashes in Redis.
+    Every id requested by the query is fetched in a single pipelined round-trip, then served from memory """
+
+    def __init__(self, redis_conn=None):
+        self.redis_conn = redis_conn or get_redis_conn()
+        self._loaded = {}
+        self._pending = set()
+
+    def prime(self, product_ids):
+        """ Queue product ids to fetch with the next batch """
+        self._pending.update(str(product_id) for product_id in product_ids if str(product_id) not in self._loaded)
+
+    def load(self, product_id):
+        """ Get the stock hash of a product (empty dict if it is not in Redis) """
+        return self.load_many([product_id])[0]
+
+    def load_many(self, product_ids):
+        """ Get the stock hashes of several products, in the order of product_ids """
+        product_ids = [str(product_id) for product_id in product_ids]
+        self.prime(product_ids)
+        self.dispatch()
+        return [self._loaded[product_id] for product_id in product_ids]
+
+    def fill(self, products):
+        """ Provide stock hashes fetched elsewhere (dict keyed by product id) """
+        self._loaded.update((str(product_id), product_data) for product_id, product_data in products.items())
+
+    def dispatch(self):
+        """ Fetch all queued product ids with one pipelined HGETALL batch """
+        if not self._pending:
+            return
+        product_ids = list(self._pending)
+        self._pending.clear()
+        pipeline = self.redis_conn.pipeline(transaction=False)
+        for product_id in product_ids:
+            pipeline.hgetall(f"stock:{product_id}")
+        self._loaded.update(zip(product_ids, pipeline.execute()))
+
+def collect_product_ids(document, variables=None):
+    """ Find the product ids requested anywhere in a GraphQL document (fields, aliases and fragments).
+    variables must be the coerced ones, defaults included (see prepare_query) """
+    product_ids = set()
+
+    class ProductIdCollector(Visitor):
+        def enter_field(self, node, *args):
+            argument_name = PRODUCT_ID_ARGUMENTS.get(node.name.value)
+            for argument in node.arguments or ():
+                if argument.name.value != argument_name:
+                    continue
+                value = value_from_ast_untyped(argument.value, variables)
+                # Une variable absente de variables donne Undefined (alias INVALID): ce n'est pas un identifiant
+                if isinstance(value, (list, tuple)):
+                    product_ids.update(str(v) for v in value if v is not None and v is not Undefined)
+                elif value is not None and value is not Undefined:
+                    product_ids.add(str(value))
+
+    visit(document, ProductIdCollector())
+    return product_ids
+
+def get_product_loader(info):
+    """ Get the loader of the current GraphQL request, or a new one if the query runs without context """
+    context = info.context if isinstance(info.context, dict) else None
+    if context is None:
+        return ProductLoader()
+    return context.setdefault('product_loader', ProductLoader())
@@ -1,28 +1,39 @@
 import graphene
-from graphene import ObjectType, String, Int
+from graphene import ObjectType, String, Int, ID, List, NonNull
 from stocks.schemas.product import Product
-from db import get_redis_conn
+from stocks.schemas.loaders import get_product_loader
 
 class Query(ObjectType):       
     product = graphene.Field(Product, id=String(required=True))
+    products = List(Product, ids=List(NonNull(ID), required=True))
     stock_level = Int(product_id=String(required=True))
+    stock_levels = List(Int, product_ids=List(NonNull(ID), required=True))
     
     def resolve_product(self, info, id):
         """ Create an instance of Product based on stock info for that product that is in Redis """
-        redis_client = get_redis_conn()
-        product_data = redis_client.hgetall(f"stock:{id}")
-        if product_data:
-            return Product(
-                id=id,
-                name=product_data['product_name'],
-                sku=product_data['product_sku'],
-                price=float(product_data['product_unit_price']),
-                quantity=int(product_data['quantity'])
-            )
-        return None
+        return _to_product(id, get_product_loader(info).load(id))
+
+    def resolve_products(self, info, ids):
+        """ Create Product instances for several products with one Redis round-trip (None for unknown ids) """
+        return [_to_product(id, product_data) for id, product_data in zip(ids, get_product_loader(info).load_many(ids))]
     
     def resolve_stock_level(self, info, product_id):
         """ Retrieve stock quantity from Redis """
-        redis_client = get_redis_conn()
-        quantity = redis_client.hget(f"stock:{product_id}", "quantity")
-        return int(quantity) if quantity else 0
\ No newline at end of file
+        quantity = get_product_loader(info).load(product_id).get('quantity')
+        return int(quantity) if quantity else 0
+
+    def resolve_stock_levels(self, info, product_ids):
+        """ Retrieve the stock quantities of several products with one Redis round-trip """
+        quantities = [product_data.get('quantity') for product_data in get_product_loader(info).load_many(product_ids)]
+        return [int(quantity) if quantity else 0 for quantity in quantities]
+
+def _to_product(id, product_data):
+    if product_data:
+        return Product(
+            id=id,
+            name=product_data['product_name'],
+            sku=product_data['product_sku'],
+            price=float(product_data['product_unit_price']),
+            quantity=int(product_data['quantity'])
+        )
+    return None
@@ -0,0 +1,10 @@
+"""
+GraphQL schema
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from graphene import Schema
+from stocks.schemas.query import Query
+
+# Le schéma est construit une seule fois, au démarrage
+schema = Schema(query=Query)
@@ -3,29 +3,65 @@ Order manager application
 SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
+import atexit
+import click
+import os
 import threading
-from graphene import Schema
-from stocks.schemas.query import Query
 from flask import Flask, request, jsonify
-from orders.controllers.order_controller import create_order, remove_order, get_order, get_report_highest_spending_users, get_report_best_selling_products
-from orders.controllers.user_controller import create_user, remove_user, get_user
-from stocks.controllers.product_controller import create_product, remove_product, get_product
-from stocks.controllers.stock_controller import get_stock, set_stock, get_stock_overview
-from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST
-import threading
+from orders.controllers.order_controller import create_order, create_orders_batch, remove_order, get_order, get_orders, get_report, parse_report_window
+from orders.controllers.user_controller import create_user, remove_user, get_user, get_users
+from stocks.controllers.product_controller import create_product, remove_product, get_product, get_products
+from stocks.controllers.stock_controller import get_stock, get_stocks, set_stock, get_stock_overview, populate_redis_on_startup
+from stocks.controllers.graphql_controller import execute_graphql
+from orders.commands.write_leaderboard import rebuild_leaderboards_from_mysql
+from workers.outbox_relay import OutboxRelay
+from workers.report_scheduler import ReportScheduler
+from workers.cache_invalidation import CacheInvalidationListener
+from prometheus_client import CollectorRegistry, Counter, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+from db import remove_scoped_session
+from serialization import FastJSONProvider
+from instrumentation import init_app_metrics
+from tracing import init_tracing
 
 
 app = Flask(__name__)
-
-
-# Auto-generate Redis reports 2 seconds after startup (to give enough time for the DB to start up as well). Once done for the first time, repeat it recursively every 60s to refresh the cache.
-def generate_reports_and_cache():
-    threading.Timer(2.0, get_report_highest_spending_users, args=(True,)).start()
-    threading.Timer(2.0, get_report_best_selling_products, args=(True,)).start()
-    threading.Timer(60.0, generate_reports_and_cache).start()
-
-# Start the first execution
-generate_reports_and_cache()
+app.json = FastJSONProvider(app)
+# Durée des requêtes par route, requêtes en cours, et temps passé dans MySQL/Redis/Python (voir instrumentation.py)
+init_app_metrics(app)
+# Traces OpenTelemetry des requêtes et de leurs étapes, si TRACING_EXPORTER est défini (voir tracing.py)
+init_tracing(app)
+
+
+# Background workers are started explicitly (see __main__ and server.py), never on import: tests and CLI commands don't run them
+background_workers = []
+
+def start_background_workers(per_host=True, per_process=True):
+    """Start the background workers. Per host: the Redis stock warmup and the report scheduler.
+    Per process: the outbox relay and the cache invalidation listener (each process has its own in-memory caches)"""
+    if per_host:
+        # Sync the Redis stock with MySQL once at startup (2s later, to give the DB time to start), so the write path only has to check a marker key
+        warmup = threading.Timer(2.0, populate_redis_on_startup)
+        warmup.daemon = True
+        warmup.start()
+    workers = []
+    if per_process:
+        workers.extend([OutboxRelay(), CacheInvalidationListener()])
+    if per_host:
+        workers.append(ReportScheduler())
+    for worker in workers:
+        worker.start()
+    background_workers.extend(workers)
+
+def stop_background_workers():
+    """Stop the background workers cleanly"""
+    for worker in background_workers:
+        worker.stop()
+    background_workers.clear()
+
+@app.teardown_appcontext
+def shutdown_session(exception=None):
+    """Return the request's MySQL connection to the pool"""
+    remove_scoped_session()
 
 @app.get('/health-check')
 def health():
@@ -40,6 +76,13 @@ def post_orders():
     counter_orders.inc()
     return create_order(request)
 
+counter_orders_batch = Counter('orders_batch', 'Total calls to /orders/batch')
+@app.post('/orders/batch')
+def post_orders_batch():
+    """Create many orders based on information on request body, with a single transaction"""
+    counter_orders_batch.inc()
+    return create_orders_batch(request)
+
 @app.delete('/orders/<int:order_id>')
 def delete_orders_id(order_id):
     """Delete an order with a given order_id"""
@@ -87,48 +130,82 @@ def get_user_id(user_id):
     return get_user(user_id)
 
 @app.get('/stocks/<int:product_id>')
-def get_stocks(product_id):
+def get_stocks_id(product_id):
     """Get product stocks by product_id"""
     return get_stock(product_id)
 
+# Bulk reads: ?ids=1,2,3 (at most BULK_READ_MAX_IDS)
+@app.get('/orders')
+def get_orders_ids():
+    """Get several orders by order_id"""
+    return get_orders(request)
+
+@app.get('/products')
+def get_products_ids():
+    """Get several products by product_id"""
+    return get_products(request)
+
+@app.get('/users')
+def get_users_ids():
+    """Get several users by user_id"""
+    return get_users(request)
+
+@app.get('/stocks')
+def get_stocks_ids():
+    """Get the stocks of several products by product_id"""
+    return get_stocks(request)
+
 counter_highest_spenders = Counter('highest_spenders', 'Total calls to /orders/reports/highest-spenders')
 @app.get('/orders/reports/highest-spenders')
 def get_orders_highest_spending_users():
-    """Get list of highest speding users, ordered by total expenditure"""
+    """Get list of highest speding users, ordered by total expenditure (all-time, or ?window=30d / ?from=&to=)"""
     counter_highest_spenders.inc()
-    rows = get_report_highest_spending_users()
-    return jsonify(rows)
+    try:
+        window = parse_report_window(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return get_report(request, 'highest_spenders', window)
 
 counter_best_sellers = Counter('best_sellers', 'Total calls to /orders/reports/best-sellers')
 @app.get('/orders/reports/best-sellers')
 def get_orders_report_best_selling_products():
-    """Get list of best selling products, ordered by number of orders"""
+    """Get list of best selling products, ordered by number of orders (all-time, or ?window=30d / ?from=&to=)"""
     counter_best_sellers.inc()
-    rows = get_report_best_selling_products()
-    return jsonify(rows)
+    try:
+        window = parse_report_window(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return get_report(request, 'best_sellers', window)
 
 @app.get('/stocks/reports/overview-stocks')
 def get_stocks_overview():
-    """Get stocks for all products"""
-    rows = get_stock_overview()
-    return jsonify(rows)
+    """Get stocks for all products (?limit=&after_product_id= for one page, ?format=ndjson|csv to stream them)"""
+    return get_stock_overview(request)
 
 # Endpoint that allows suppliers to check stock
 @app.post('/stocks/graphql-query')
 def graphql_supplier():
-    data = request.get_json()
-    schema = Schema(query=Query)
-    result = schema.execute(data['query'], variables=data.get('variables'))
-    return jsonify({
-        'data': result.data,
-        'errors': [str(e) for e in result.errors] if result.errors else None
-    })
+    return execute_graphql(request)
+
 
+# One-shot command: flask --app store_manager rebuild-leaderboards
+@app.cli.command('rebuild-leaderboards')
+def rebuild_leaderboards():
+    """Seed the Redis report leaderboards from the orders stored in MySQL"""
+    counts = rebuild_leaderboards_from_mysql()
+    click.echo(f"Leaderboards rebuilt: {counts['users']} users, {counts['products']} products")
 
 @app.route("/metrics")
 def metrics():
+    # Under server.py, each worker process writes its metrics to PROMETHEUS_MULTIPROC_DIR: they are merged here
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
     return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
 
-# Start Flask app
+# Start Flask app (development server; use server.py in production)
 if __name__ == '__main__':
+    start_background_workers()
+    atexit.register(stop_background_workers)
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,71 @@
+"""
+Tests for the asyncio read path
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+
+import asyncio
+import threading
+import pytest
+from flask import Flask
+from prometheus_client import generate_latest
+
+pytest.importorskip('quart')
+pytest.importorskip('asgiref')
+pytest.importorskip('aiomysql')
+
+from async_app import ReadWriteDispatcher, async_app
+
+def test_read_routes_validate_requests():
+    """Smoke test: the Quart read routes answer without touching Redis or MySQL when the request is invalid"""
+    async def run():
+        client = async_app.test_client()
+        missing_ids = await client.get('/products')
+        invalid_ids = await client.get('/orders?ids=1,x')
+        invalid_window = await client.get('/orders/reports/best-sellers?window=abc')
+        graphql = await client.post('/stocks/graphql-query', json={'query': '{ stockLevels(productIds: [%s]) }' % ','.join(['"1"'] * 5000)})
+        return missing_ids, invalid_ids, invalid_window, graphql, await graphql.get_json()
+
+    missing_ids, invalid_ids, invalid_window, graphql, graphql_body = asyncio.run(run())
+    assert missing_ids.status_code == 400
+    assert invalid_ids.status_code == 400
+    assert invalid_window.status_code == 400
+    assert graphql.status_code == 200
+    assert "exceeds the maximum cost" in graphql_body['errors'][0]
+
+def test_read_routes_metrics():
+    """The Quart read routes get the same latency metrics as the Flask routes"""
+    asyncio.run(async_app.test_client().get('/products'))
+    metrics = generate_latest().decode()
+    assert 'quart_http_request_duration_seconds_count{method="GET",status="400",url_rule="/products"}' in metrics
+    assert 'http_request_backend_duration_seconds_count{backend="python",route="/products"}' in metrics
+    assert 'http_requests_in_flight{method="GET",route="/products"} 0.0' in metrics
+
+def test_other_routes_run_on_the_flask_thread_pool():
+    """Requests that are not async reads go to the Flask app, several at a time on the WSGI thread pool"""
+    started = threading.Barrier(2, timeout=5)
+    wsgi_app = Flask(__name__)
+    application = ReadWriteDispatcher(async_app, wsgi_app, max_workers=2)
+
+    @wsgi_app.get('/tests/wait-for-another-request')
+    def wait_for_another_request():
+        # Ne se termine que si deux requêtes s'exécutent en même temps dans deux threads
+        started.wait()
+        return 'ok'
+
+    async def call(path):
+        messages = []
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        async def send(message):
+            messages.append(message)
+        scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http', 'path': path,
+                 'raw_path': path.encode(), 'query_string': b'', 'root_path': '', 'headers': [],
+                 'server': ('localhost', 5000), 'client': ('127.0.0.1', 12345)}
+        await application(scope, receive, send)
+        return messages[0]['status']
+
+    async def run():
+        return await asyncio.gather(call('/tests/wait-for-another-request'), call('/tests/wait-for-another-request'))
+
+    assert asyncio.run(run()) == [200, 200]
@@ -0,0 +1,26 @@
+"""
+Tests for bulk reads
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+
+import config
+import pytest
+from bulk import bulk_result, parse_ids
+
+def test_parse_ids_keeps_request_order_without_duplicates():
+    assert parse_ids({'ids': '3, 1,3,2,1'}) == [3, 1, 2]
+
+@pytest.mark.parametrize('raw_ids', ['', '1,,2', '1,a', '0', '1,-2', '²', '1.5'])
+def test_parse_ids_rejects_invalid_ids(raw_ids):
+    with pytest.raises(ValueError):
+        parse_ids({'ids': raw_ids})
+
+def test_parse_ids_rejects_too_many_ids():
+    assert len(parse_ids({'ids': ','.join(['1'] * config.BULK_READ_MAX_IDS)})) == 1
+    with pytest.raises(ValueError, match="Too many IDs"):
+        parse_ids({'ids': ','.join(['1'] * (config.BULK_READ_MAX_IDS + 1))})
+
+def test_bulk_result_orders_items_and_lists_missing():
+    found = {2: {'id': 2}, 1: {'id': 1}}
+    assert bulk_result([1, 3, 2], found) == {'items': [{'id': 1}, {'id': 2}], 'missing': [3]}
@@ -0,0 +1,29 @@
+"""
+Tests for the HTTP caching helpers
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+
+import gzip
+from flask import Flask, request
+from http_cache import cached_response, make_etag
+
+app = Flask(__name__)
+body = b'[{"product_id": 1, "quantity": 10}]'
+etag = make_etag(body)
+
+def test_gzip_version_has_its_own_etag():
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = cached_response(request, None, etag, gzipped_body=gzip.compress(body))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == etag[:-1] + '-gzip"'
+    with app.test_request_context():
+        response = cached_response(request, None, etag, gzipped_body=gzip.compress(body))
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == etag and response.get_data() == body
+
+def test_gzip_etag_revalidates():
+    headers = {'Accept-Encoding': 'gzip', 'If-None-Match': etag[:-1] + '-gzip"'}
+    with app.test_request_context(headers=headers):
+        response = cached_response(request, None, etag, gzipped_body=gzip.compress(body))
+    assert response.status_code == 304
@@ -4,8 +4,10 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
+import hashlib
 import json
 import uuid
+import config
 from logger import Logger
 import pytest
 from store_manager import app
@@ -95,4 +97,90 @@ def test_stock_flow(client):
     stock_data = response.get_json()
     assert stock_data['product_id'] == product_id
     assert stock_data['quantity'] == 3, f"Expected 3 units, got {stock_data['quantity']}"
-    logger.debug(f"Stock after order: {stock_data['quantity']} units")
\ No newline at end of file
+    logger.debug(f"Stock after order: {stock_data['quantity']} units")
+
+def test_orders_batch(client):
+    """Smoke test for batch order creation with a partial failure"""
+    response = client.post('/products',
+                          data=json.dumps({'name': 'Batch Product', 'sku': 'TEST-SKU-002', 'price': 10.0}),
+                          content_type='application/json')
+    assert response.status_code == 201, f"Failed to create product: {response.get_json()}"
+    product_id = response.get_json()['product_id']
+
+    response = client.post('/stocks',
+                          data=json.dumps({'product_id': product_id, 'quantity': 5}),
+                          content_type='application/json')
+    assert response.status_code == 201, f"Failed to set stock: {response.get_json()}"
+
+    response = client.post('/users',
+                          data=json.dumps({'name': 'Batch User', 'email': f"t{uuid.uuid1()}@example.com"}),
+                          content_type='application/json')
+    assert response.status_code == 201, f"Failed to create user: {response.get_json()}"
+    user_id = response.get_json()['user_id']
+
+    # The second order asks for more units than what is left after the first one
+    batch_data = {
+        'orders': [
+            {'user_id': user_id, 'items': [{'product_id': product_id, 'quantity': 2}]},
+            {'user_id': user_id, 'items': [{'product_id': product_id, 'quantity': 4}]}
+        ]
+    }
+    response = client.post('/orders/batch',
+                          data=json.dumps(batch_data),
+                          content_type='application/json')
+    assert response.status_code == 207, f"Unexpected batch result: {response.get_json()}"
+    results = response.get_json()['results']
+    assert results[0]['order_id'] > 0
+    assert 'error' in results[1]
+
+    response = client.get(f'/stocks/{product_id}')
+    assert response.get_json()['quantity'] == 3
+
+def test_graphql_query_cost_limit(client):
+    """Queries over the cost budget are rejected before touching Redis"""
+    query = 'query Levels($ids: [ID!]!) { stockLevels(productIds: $ids) }'
+    variables = {'ids': [str(i) for i in range(1, 5001)]}
+    response = client.post('/stocks/graphql-query',
+                          data=json.dumps({'query': query, 'variables': variables}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    errors = response.get_json()['errors']
+    assert errors and 'exceeds the maximum cost' in errors[0]
+
+def test_graphql_query_cost_variable_defaults(client):
+    """A list given as a variable default value is costed like one sent in the variables"""
+    ids = ', '.join(f'"{i}"' for i in range(1, 5001))
+    query = f'query Levels($ids: [ID!]! = [{ids}]) {{ stockLevels(productIds: $ids) }}'
+    response = client.post('/stocks/graphql-query',
+                          data=json.dumps({'query': query}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    errors = response.get_json()['errors']
+    assert errors and 'exceeds the maximum cost' in errors[0]
+
+def test_graphql_persisted_query_size_limit(client):
+    """Persisted queries over the size limit are refused before touching Redis"""
+    query = '{ stockLevels(productIds: ["1"]) }' + ' ' * config.GRAPHQL_PERSISTED_QUERY_MAX_LENGTH
+    query_hash = hashlib.sha256(query.encode('utf-8')).hexdigest()
+    response = client.post('/stocks/graphql-query',
+                          data=json.dumps({'query': query, 'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': query_hash}}}),
+                          content_type='application/json')
+    assert response.status_code == 400
+    assert 'cannot be persisted' in response.get_json()['errors'][0]
+
+def test_graphql_product_ids_from_variable_defaults():
+    """Product ids given as variable defaults are loaded before the execution"""
+    from stocks.controllers.graphql_controller import prepare_query
+    from stocks.schemas.loaders import collect_product_ids
+    query = 'query Levels($ids: [ID!]! = ["1", "2"]) { stockLevels(productIds: $ids) }'
+    document, variables, errors = prepare_query(query, {'query': query})
+    assert errors is None
+    assert collect_product_ids(document, variables) == {'1', '2'}
+
+def test_metrics_route_latency(client):
+    """Each route gets its own latency histogram and MySQL/Redis/Python breakdown on /metrics"""
+    client.get('/health-check')
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'flask_http_request_duration_seconds_count{method="GET",status="200",url_rule="/health-check"}' in metrics
+    assert 'http_request_backend_duration_seconds_count{backend="python",route="/health-check"}' in metrics
+    assert 'http_requests_in_flight{method="GET",route="/health-check"} 0.0' in metrics
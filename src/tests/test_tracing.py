@@ -0,0 +1,42 @@
+"""
+Tests for tracing
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+
+import pytest
+
+pytest.importorskip('opentelemetry.sdk')
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+import tracing
+from store_manager import app
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_SPAN_ID = '00f067aa0ba902b7'
+
+@pytest.fixture
+def exporter():
+    exporter = InMemorySpanExporter()
+    tracing.init_tracing(exporter=exporter)
+    yield exporter
+    tracing._tracer = None
+
+def test_order_spans_continue_the_incoming_trace(exporter):
+    """The request span continues the traceparent sent by nginx, add_order and its stages are its children"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        # Sans MySQL/Redis, add_order échoue dès la lecture des prix: ses spans sont tout de même exportés
+        client.post('/orders', json={'user_id': 1, 'items': [{'product_id': 1, 'quantity': 1}]},
+                    headers={'traceparent': f'00-{TRACE_ID}-{PARENT_SPAN_ID}-01', 'X-Request-Id': 'abc'})
+    trace.get_tracer_provider().force_flush()
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+
+    request_span = spans['POST /orders']
+    assert format(request_span.context.trace_id, '032x') == TRACE_ID
+    assert format(request_span.parent.span_id, '016x') == PARENT_SPAN_ID
+    assert request_span.attributes['http.request_id'] == 'abc'
+    assert spans['add_order'].parent.span_id == request_span.context.span_id
+    assert spans['add_order.product_prices'].parent.span_id == spans['add_order'].context.span_id
+    assert all(span.context.trace_id == request_span.context.trace_id for span in spans.values())
@@ -0,0 +1,117 @@
+"""
+Tracing (OpenTelemetry, optional)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import contextlib
+import functools
+import config
+from flask import g, request
+from logger import Logger
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # opentelemetry est optionnel: sans lui (ou avec TRACING_EXPORTER=none), span() ne fait rien
+    trace = None
+
+logger = Logger.get_instance("tracing")
+
+_tracer = None
+
+def init_tracing(app=None, exporter=None):
+    """ Install the tracer provider (exporter from config unless given, sampling from config) and trace the requests
+    of a Flask app. Does nothing when TRACING_EXPORTER is none or OpenTelemetry is not installed """
+    global _tracer
+    if trace is None:
+        if config.TRACING_EXPORTER != 'none':
+            logger.error(f"TRACING_EXPORTER={config.TRACING_EXPORTER} mais opentelemetry-sdk n'est pas installé: aucune trace")
+        return
+    if app is not None:
+        # Les hooks sont installés même sans exporteur (ils ne font rien tant que _tracer est None):
+        # Flask refuse d'en ajouter une fois que l'application a servi une requête
+        _trace_requests(app)
+    if exporter is None and config.TRACING_EXPORTER == 'none':
+        return
+    if _tracer is None:
+        # ParentBased: si nginx (ou le client) envoie un traceparent, sa décision d'échantillonnage est respectée
+        provider = TracerProvider(
+            resource=Resource.create({'service.name': config.TRACING_SERVICE_NAME}),
+            sampler=ParentBased(TraceIdRatioBased(config.TRACING_SAMPLE_RATIO))
+        )
+        # Export par lots dans un thread: la requête n'attend jamais l'exporteur
+        provider.add_span_processor(BatchSpanProcessor(exporter or _make_exporter()))
+        trace.set_tracer_provider(provider)
+        _tracer = provider.get_tracer("store_manager")
+
+def tracing_enabled():
+    """ True if spans are recorded (tracing configured and OpenTelemetry installed) """
+    return _tracer is not None
+
+def span(name, **attributes):
+    """ Context manager recording a stage of the current trace as a child span (no-op when tracing is off) """
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+def traced(name):
+    """ Decorator recording each call of a function as a span """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _make_exporter():
+    if config.TRACING_EXPORTER == 'otlp':
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=config.TRACING_OTLP_ENDPOINT)
+    if config.TRACING_EXPORTER == 'file':
+        # Un span JSON par ligne, ajouté au fichier: fonctionne sans collecteur
+        return ConsoleSpanExporter(out=open(config.TRACING_FILE, 'a'), formatter=lambda finished_span: finished_span.to_json(indent=None) + '\n')
+    if config.TRACING_EXPORTER == 'console':
+        return ConsoleSpanExporter()
+    raise ValueError(f"Invalid TRACING_EXPORTER {config.TRACING_EXPORTER}. Expected none, console, file or otlp.")
+
+def _trace_requests(app):
+    @app.before_request
+    def start_request_span():
+        if _tracer is None or request.path == '/metrics':
+            return
+        # Contexte W3C (traceparent/tracestate) transmis par nginx
+        parent = propagate.extract(request.headers)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_span = _tracer.start_span(f"{request.method} {route}", context=parent, kind=SpanKind.SERVER, attributes={
+            'http.method': request.method,
+            'http.route': route,
+            'http.target': request.full_path,
+            'http.request_id': request.headers.get('X-Request-Id', '')
+        })
+        g.trace_span = request_span
+        g.trace_token = otel_context.attach(trace.set_span_in_context(request_span, parent))
+
+    @app.after_request
+    def record_response_status(response):
+        request_span = g.get('trace_span')
+        if request_span is not None:
+            request_span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                request_span.set_status(Status(StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def end_request_span(exception=None):
+        request_span = g.pop('trace_span', None)
+        if request_span is None:
+            return
+        if exception is not None:
+            request_span.record_exception(exception)
+            request_span.set_status(Status(StatusCode.ERROR, str(exception)))
+        request_span.end()
+        otel_context.detach(g.pop('trace_token'))
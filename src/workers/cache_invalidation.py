@@ -0,0 +1,47 @@
+"""
+Cache invalidation listener (Redis pub/sub -> in-process caches)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+from logger import Logger
+from prometheus_client import Counter
+from cache import CACHE_INVALIDATION_CHANNEL, apply_invalidation, local_caches
+from db import get_redis_conn
+
+logger = Logger.get_instance("cache_invalidation")
+
+cache_invalidations_received = Counter('cache_invalidations_received', 'Cache invalidation messages received from the other replicas')
+
+class CacheInvalidationListener(threading.Thread):
+    """ Background thread that removes the entries invalidated by any replica from the in-process caches """
+
+    def __init__(self, retry_delay=1.0):
+        super().__init__(name="cache-invalidation", daemon=True)
+        self.retry_delay = retry_delay
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            pubsub = None
+            try:
+                pubsub = get_redis_conn().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+                # Des messages ont pu être perdus pendant une déconnexion: on repart de caches vides
+                for cache in list(local_caches.values()):
+                    cache.clear()
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        apply_invalidation(message['data'])
+                        cache_invalidations_received.inc()
+            except Exception as e:
+                logger.error(f"Erreur de l'écoute des invalidations de cache: {e}")
+                self._stopped.wait(self.retry_delay)
+            finally:
+                if pubsub is not None:
+                    pubsub.close()
+
+    def stop(self):
+        """ Ask the listener to stop """
+        self._stopped.set()
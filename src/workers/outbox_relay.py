@@ -0,0 +1,130 @@
+"""
+Outbox relay (MySQL outbox -> Redis read model)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+import config
+from logger import Logger
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+from db import get_engine, get_redis_conn, get_sqlalchemy_session
+from orders.models.outbox_event import OutboxEvent
+from orders.commands.write_order import add_order_to_redis, delete_order_from_redis
+from orders.commands.write_outbox import APPLIED_EVENTS_KEY, ORDER_CREATED, ORDER_DELETED, STOCK_CHANGED, outbox_relay_lock, outbox_wakeup
+from stocks.commands.write_stock import mark_stock_changed
+from serialization import loads
+
+logger = Logger.get_instance("outbox_relay")
+
+APPLIED_EVENTS_RETENTION = 24 * 3600
+
+outbox_backlog = Gauge('outbox_backlog', 'Outbox events waiting to be relayed to Redis', multiprocess_mode='max')
+outbox_lag = Gauge('outbox_lag_seconds', 'Age of the oldest outbox event waiting to be relayed', multiprocess_mode='max')
+outbox_relayed = Counter('outbox_events_relayed', 'Outbox events applied to Redis', ['event_type'])
+outbox_errors = Counter('outbox_relay_errors', 'Failed outbox relay batches')
+
+def apply_event(pipeline, event_type, payload):
+    """ Queue the Redis changes of one outbox event on a pipeline """
+    if event_type == ORDER_CREATED:
+        add_order_to_redis(pipeline, payload['order_id'], payload['user_id'], payload['total_amount'], payload['items'], payload.get('created_at'))
+    elif event_type == ORDER_DELETED:
+        delete_order_from_redis(pipeline, payload['order_id'], payload['user_id'], payload['total_amount'], payload['items'], payload.get('created_at'))
+    elif event_type == STOCK_CHANGED:
+        mark_stock_changed(pipeline, payload['product_ids'])
+    else:
+        logger.error(f"Type d'événement inconnu: {event_type}")
+
+def relay_outbox_batch(batch_size=None):
+    """ Apply the oldest outbox events to Redis with one pipeline, then remove them from the outbox.
+    Returns the number of events handled """
+    batch_size = batch_size or config.OUTBOX_BATCH_SIZE
+    with outbox_relay_lock() as acquired:
+        if not acquired:
+            # Un autre réplica relaie, ou les classements sont en reconstruction: le prochain réveil réessaiera
+            return 0
+        return _relay_events(batch_size)
+
+def _relay_events(batch_size):
+    session = get_sqlalchemy_session()
+    try:
+        # FOR UPDATE: les lignes lues ne peuvent pas être supprimées par une autre transaction avant la nôtre
+        events = session.query(OutboxEvent)\
+            .order_by(OutboxEvent.id)\
+            .limit(batch_size)\
+            .with_for_update()\
+            .all()
+        if not events:
+            session.commit()
+            return 0
+
+        r = get_redis_conn()
+        event_ids = [event.id for event in events]
+        already_applied = r.zmscore(APPLIED_EVENTS_KEY, event_ids)
+        now = time.time()
+        pipeline = r.pipeline(transaction=True)
+        applied = []
+        for event, applied_at in zip(events, already_applied):
+            if applied_at is None:
+                apply_event(pipeline, event.event_type, loads(event.payload))
+                applied.append(event)
+        pipeline.zadd(APPLIED_EVENTS_KEY, {event_id: now for event_id in event_ids})
+        pipeline.zremrangebyscore(APPLIED_EVENTS_KEY, '-inf', now - APPLIED_EVENTS_RETENTION)
+        pipeline.execute()
+
+        session.query(OutboxEvent).filter(OutboxEvent.id.in_(event_ids)).delete(synchronize_session=False)
+        session.commit()
+        for event in applied:
+            outbox_relayed.labels(event.event_type).inc()
+        return len(events)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def update_outbox_metrics():
+    """ Refresh the backlog and lag gauges with one query """
+    session = get_sqlalchemy_session()
+    try:
+        backlog, lag = session.execute(
+            text("SELECT COUNT(*), COALESCE(TIMESTAMPDIFF(SECOND, MIN(created_at), NOW()), 0) FROM outbox")
+        ).one()
+        outbox_backlog.set(backlog)
+        outbox_lag.set(lag)
+    finally:
+        session.close()
+
+class OutboxRelay(threading.Thread):
+    """ Background thread that drains the outbox into Redis, woken up after each commit or every poll interval """
+
+    def __init__(self, poll_interval=None, batch_size=None):
+        super().__init__(name="outbox-relay", daemon=True)
+        self.poll_interval = poll_interval or config.OUTBOX_POLL_INTERVAL
+        self.batch_size = batch_size or config.OUTBOX_BATCH_SIZE
+        self._stopped = threading.Event()
+
+    def run(self):
+        # Les bases créées avant l'ajout de l'outbox n'ont pas la table
+        try:
+            OutboxEvent.__table__.create(get_engine(), checkfirst=True)
+        except Exception as e:
+            logger.error(f"Impossible de créer la table outbox: {e}")
+
+        while not self._stopped.is_set():
+            outbox_wakeup.wait(self.poll_interval)
+            outbox_wakeup.clear()
+            try:
+                # Vider l'outbox par lots tant que les lots sont pleins
+                while not self._stopped.is_set() and relay_outbox_batch(self.batch_size) == self.batch_size:
+                    pass
+                update_outbox_metrics()
+            except Exception as e:
+                outbox_errors.inc()
+                logger.error(f"Erreur du relais de l'outbox: {e}")
+
+    def stop(self):
+        """ Ask the relay to stop after the current batch """
+        self._stopped.set()
+        outbox_wakeup.set()
@@ -0,0 +1,74 @@
+"""
+Report scheduler (periodic refresh of the cached reports)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import random
+import threading
+import time
+import uuid
+import config
+from logger import Logger
+from prometheus_client import Counter, Gauge, Histogram
+from db import get_redis_conn
+from orders.queries.read_order import REPORTS, refresh_report
+
+logger = Logger.get_instance("report_scheduler")
+
+# Verrou Redis partagé par tous les réplicas: le premier qui le prend reconstruit les rapports pour l'intervalle en cours
+LEADER_LOCK_KEY = "report:scheduler:leader"
+
+report_refresh_duration = Histogram('report_refresh_duration_seconds', 'Duration of a scheduled report refresh')
+report_refresh_last_success = Gauge('report_refresh_last_success_timestamp_seconds', 'Time of the last successful report refresh', multiprocess_mode='max')
+report_refresh_skipped = Counter('report_refresh_skipped', 'Scheduled report refreshes skipped', ['reason'])
+
+class ReportScheduler(threading.Thread):
+    """ Background thread that refreshes the reports every interval (plus a random jitter).
+    Only one replica refreshes per interval (Redis lock) and runs never overlap (single-flight) """
+
+    def __init__(self, interval=None, jitter=None, initial_delay=2.0):
+        super().__init__(name="report-scheduler", daemon=True)
+        self.interval = interval or config.REPORT_REFRESH_INTERVAL
+        self.jitter = config.REPORT_REFRESH_JITTER if jitter is None else jitter
+        self.initial_delay = initial_delay
+        self.token = str(uuid.uuid4())
+        self._running = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self):
+        # Laisser le temps à MySQL et Redis de démarrer
+        if self._stopped.wait(self.initial_delay):
+            return
+        while not self._stopped.is_set():
+            self.run_once()
+            self._stopped.wait(self.interval + random.uniform(0, self.jitter))
+
+    def run_once(self):
+        """ Refresh the reports now, unless a refresh is already running here or another replica is the leader """
+        if not self._running.acquire(blocking=False):
+            report_refresh_skipped.labels('overlap').inc()
+            return False
+        try:
+            r = get_redis_conn()
+            # Le verrou expire à la fin de l'intervalle: il n'est jamais libéré explicitement
+            if not r.set(LEADER_LOCK_KEY, self.token, nx=True, px=int(self.interval * 1000)):
+                report_refresh_skipped.labels('not_leader').inc()
+                return False
+            start_time = time.perf_counter()
+            # refresh_report lève l'erreur: un rafraîchissement raté n'est pas compté comme un succès
+            for report in REPORTS:
+                refresh_report(report)
+            report_refresh_duration.observe(time.perf_counter() - start_time)
+            report_refresh_last_success.set(time.time())
+            return True
+        except Exception as e:
+            logger.error(f"Erreur lors du rafraîchissement des rapports: {e}")
+            return False
+        finally:
+            self._running.release()
+
+    def stop(self, timeout=5.0):
+        """ Stop the scheduler, waiting for a refresh in progress to finish """
+        self._stopped.set()
+        if self.is_alive():
+            self.join(timeout)